@@ -0,0 +1,238 @@
+"""Admission control for the search and write endpoints.
+
+Two checks run before the view, so an overloaded app sheds requests
+before they take a database connection:
+
+* A token bucket per client address and policy. Each bucket holds up to
+  ``burst`` tokens and refills at ``rate`` tokens per second; a request
+  with no token left gets ``429 Too Many Requests``. Buckets live in
+  process memory, or in a SQLite file shared by all worker processes
+  (``RATE_LIMIT_BACKEND = 'sqlite'``).
+* A concurrency cap per policy and worker process: at most ``limit``
+  requests run at once and up to ``queue`` more wait, each for at most
+  ``timeout`` seconds. Anything beyond that gets ``503 Service
+  Unavailable``.
+
+Both responses carry ``Retry-After``.
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+
+# Endpoint name -> policy name, for both the Flask and the Quart app.
+ENDPOINT_POLICIES = {
+    'search_venues': 'search',
+    'search_artists': 'search',
+    'create_venue_submission': 'write',
+    'edit_venue_submission': 'write',
+    'delete_venue': 'write',
+    'delete_venues': 'write',
+    'create_artist_submission': 'write',
+    'edit_artist_submission': 'write',
+    'delete_artist': 'write',
+    'delete_artists': 'write',
+    'create_show_submission': 'write',
+}
+
+
+class Overloaded(Exception):
+    def __init__(self, status, retry_after):
+        super().__init__(status)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    def response(self):
+        message = 'Too many requests' if self.status == 429 else 'Server busy'
+        return f'{message}, retry in {self.retry_after}s\n', self.status, {
+            'Retry-After': str(self.retry_after),
+            'Content-Type': 'text/plain; charset=utf-8',
+        }
+
+
+# ----------------------------------------------------------------------------#
+# Token buckets.
+# ----------------------------------------------------------------------------#
+
+def refill(tokens, updated, now, rate, burst, cost):
+    """Return ``(tokens left, seconds to wait)``; zero wait means admitted."""
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBuckets:
+    """Buckets for this process only; least recently used keys are evicted."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens, wait = refill(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                # An evicted client just starts again with a full bucket.
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBuckets:
+    """Buckets in a SQLite file, shared by every process on the host."""
+
+    # Rows idle this long have refilled for any sane policy and are dropped.
+    IDLE = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # Bucket state is disposable; skip fsync on every request.
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row or (burst, now)
+            tokens, wait = refill(tokens, updated, now, rate, burst, cost)
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - self.IDLE,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+# ----------------------------------------------------------------------------#
+# Concurrency caps.
+# ----------------------------------------------------------------------------#
+
+class ConcurrencyLimit:
+    """At most ``limit`` holders, ``queue`` waiters, ``timeout`` seconds of waiting."""
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue:
+                    raise Overloaded(503, self.timeout)
+                self.waiting += 1
+                try:
+                    if not self._condition.wait_for(lambda: self.active < self.limit, self.timeout):
+                        raise Overloaded(503, self.timeout)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+
+class AsyncConcurrencyLimit(ConcurrencyLimit):
+    """The same cap for coroutines on one event loop."""
+
+    def __init__(self, limit, queue, timeout):
+        super().__init__(limit, queue, timeout)
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue:
+                    raise Overloaded(503, self.timeout)
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: self.active < self.limit), self.timeout)
+                except asyncio.TimeoutError:
+                    raise Overloaded(503, self.timeout)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+
+    async def release(self):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+
+# ----------------------------------------------------------------------------#
+# Setup.
+# ----------------------------------------------------------------------------#
+
+def buckets_for(config):
+    if config['RATE_LIMIT_BACKEND'] == 'sqlite':
+        return SQLiteBuckets(config['RATE_LIMIT_PATH'])
+    return MemoryBuckets()
+
+
+def check_rate(buckets, config, endpoint, client):
+    """The endpoint's policy name, after raising ``Overloaded`` if rate limited."""
+    policy = ENDPOINT_POLICIES.get(endpoint)
+    if policy in config['RATE_LIMITS']:
+        rate, burst = config['RATE_LIMITS'][policy]
+        wait = buckets.take(f'{policy}:{client}', rate, burst)
+        if wait:
+            raise Overloaded(429, wait)
+    return policy
+
+
+def init_app(app):
+    buckets = buckets_for(app.config)
+    limits = {policy: ConcurrencyLimit(*spec)
+              for policy, spec in app.config['CONCURRENCY_LIMITS'].items()}
+
+    @app.before_request
+    def admit():
+        policy = check_rate(buckets, app.config, request.endpoint, request.remote_addr)
+        if policy in limits:
+            limits[policy].acquire()
+            g.admission_limit = limits[policy]
+
+    @app.teardown_request
+    def release(exc):
+        limit = g.pop('admission_limit', None)
+        if limit is not None:
+            limit.release()
+
+    @app.errorhandler(Overloaded)
+    def overloaded(error):
+        return error.response()
@@ -1,28 +1,42 @@
 # ----------------------------------------------------------------------------#
 # Imports
 # ----------------------------------------------------------------------------#
-from datetime import datetime
-import json
-import dateutil.parser
-import babel
+from datetime import date, datetime
+import os
+import threading
+from urllib.parse import urlencode
 from flask import (
     Flask,
     render_template,
     request,
-    Response,
     flash,
     redirect,
     url_for,
-    config
+    abort,
+    jsonify,
+    Response,
+    send_from_directory,
 )
-from flask_migrate import Migrate
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from models import *
+from forms import VenueForm, ArtistForm, ShowForm, GENRES
+from models import db, Show
+import admission
+import assets
+import ical
+import locations
+import profiling
+from capture import RequestCapture
+from fragments import FragmentCacheExtension
+import readmodels
+from snapshot import CatalogueSnapshot
+import writes
+from jobs import JobQueue, WritePool
+from popularity import ViewCounter
+from stats import DashboardCache
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -34,8 +48,93 @@ moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
 db.app = app
-# db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+admission.init_app(app)
+assets.init_app(app)
+locations.init_app(app)
+app.jinja_env.add_extension(FragmentCacheExtension)
+os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+if app.config['TRUSTED_PROXIES']:
+    hops = app.config['TRUSTED_PROXIES']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+if app.config['CAPTURE_PATH']:
+    app.wsgi_app = RequestCapture(app.wsgi_app, app.config['CAPTURE_PATH'])
+profiling.init_app(app)
+
+# Flask-Migrate pulls in Alembic, by far the slowest import; it is only
+# needed by the `flask db` commands.
+if os.environ.get('FLASK_RUN_FROM_CLI'):
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
+
+write_queue = None
+if app.config['WRITE_BEHIND']:
+    write_queue = JobQueue(app.config['WRITE_QUEUE_PATH'])
+
+catalogue = CatalogueSnapshot(app, app.config['CATALOGUE_SNAPSHOT_PATH'],
+                              interval=app.config['CATALOGUE_SNAPSHOT_INTERVAL'])
+dashboard = DashboardCache(app, app.config['DASHBOARD_PATH'], catalogue.dirty_path,
+                           interval=app.config['DASHBOARD_REFRESH_INTERVAL'])
+views = ViewCounter(app, flush_interval=app.config['VIEW_FLUSH_INTERVAL'],
+                    refresh_interval=app.config['POPULAR_REFRESH_INTERVAL'],
+                    window=app.config['POPULAR_WINDOW_DAYS'],
+                    limit=app.config['POPULAR_LIMIT'],
+                    retention=app.config['VIEW_RETENTION_DAYS'])
+
+_services_started = False
+_services_lock = threading.Lock()
+
+
+def start_services():
+    """Start this process's background threads; safe to call repeatedly.
+
+    Threads do not survive fork, so with ``--preload`` this must run in
+    each worker rather than in the master; the ``before_request`` hook
+    below takes care of that on the first request.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        if write_queue is not None:
+            WritePool(app, db, write_queue, writes.APPLY,
+                      workers=app.config['WRITE_WORKERS'],
+                      batch_size=app.config['WRITE_BATCH_SIZE']).start()
+        dashboard.start()
+        catalogue.start()
+        views.start()
+        _services_started = True
+
+
+@app.before_request
+def ensure_services():
+    if not _services_started:
+        start_services()
+
+
+def warm_up():
+    """Load every template and the date formatting locale data.
+
+    Templates come from the on-disk bytecode cache when it is current, so
+    only the first boot after a template change compiles anything.
+    """
+    for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(name)
+    format_datetime(datetime.now(), 'full')
+
+
+def warmed_app():
+    """The module's ``app`` with templates and locale data preloaded.
+
+    Not an application factory: the app, its extensions, middleware and
+    services are all set up when this module is imported, and every call
+    returns that same ``app``. It is the WSGI entry point for a preloading
+    server, e.g. ``gunicorn --preload 'app:warmed_app()'``, so the master
+    does the warm-up once and forked workers share it.
+    """
+    warm_up()
+    return app
 
 
 # ----------------------------------------------------------------------------#
@@ -43,12 +142,18 @@ migrate = Migrate(app, db)
 # ----------------------------------------------------------------------------#
 
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
+    # babel.dates and dateutil are imported on first use to keep startup fast.
+    from babel.dates import format_datetime as babel_format_datetime
+    if isinstance(value, datetime):
+        date = value
+    else:
+        import dateutil.parser
+        date = dateutil.parser.parse(value)
     if format == 'full':
         format = "EEEE MMMM, d, y 'at' h:mma"
     elif format == 'medium':
         format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    return babel_format_datetime(date, format, locale='en')
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -58,54 +163,80 @@ app.jinja_env.filters['datetime'] = format_datetime
 # Controllers.
 # ----------------------------------------------------------------------------#
 
+def render_home():
+    return render_template('pages/home.html', dashboard=dashboard.current())
+
+
 @app.route('/')
 def index():
-    return render_template('pages/home.html')
+    return render_home()
+
+
+def queue_write(message, kind, *args):
+    # Post/redirect/get: the job is applied by the write-behind workers. 303
+    # so that DELETE requests from fetch() also follow up with a GET.
+    job_id = write_queue.enqueue(kind, *args)
+    flash(message + ' Track it at ' + url_for('job_status', job_id=job_id))
+    return redirect(url_for('index'), code=303)
+
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    job = write_queue.status(job_id) if write_queue is not None else None
+    if job is None:
+        abort(404)
+    return jsonify(job)
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
+def requested_page():
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        abort(404)
+    return page
+
+
 @app.route('/venues')
 def venues():
-    data = []
-    venues_s = Venue.query.all()
-    cities_and_states = []
-    for venue in venues_s:
-        cities_and_states.append({'city': venue.city, 'state': venue.state})
-
-    this_time = datetime.now()
-
-    for loc in cities_and_states:
-        ven_list = []
-        for venue in venues_s:
-            if venue.city == loc["city"] and venue.state == loc["state"]:
-                ven_shows = Show.query.filter_by(venue_id=venue.id).all()
-                upcoming = 0
-                for show in ven_shows:
-                    if show.start_time > this_time:
-                        upcoming += 1
-
-                ven_list.append({
-                    "id": venue.id,
-                    "name": venue.name,
-                    "upcoming_shows": upcoming
-                })
-        data.append({
-            "city": loc["city"],
-            "state": loc["state"],
-            "venues": ven_list
-        })
-
-    return render_template('pages/venues.html', areas=data)
+    page = requested_page()
+    snapshot = catalogue.current()
+    areas, pagination = (snapshot or readmodels).area_index(page)
+    if snapshot is not None and page > pagination.pages:
+        # The snapshot may not have the newest areas yet.
+        snapshot = None
+        areas, pagination = readmodels.area_index(page)
+    if page > pagination.pages:
+        abort(404)
+    return render_template('pages/venues.html', areas=areas, pagination=pagination,
+                           popular=views.popular('venue') if page == 1 else [],
+                           snapshot_built_at=snapshot.built_at if snapshot else None)
+
+
+@app.route('/venues/<state>/<city>')
+def area_venues(state, city):
+    page = requested_page()
+    canonical = locations.normalize_state(state), locations.slugify(locations.normalize_city(city))
+    if (state, city) != canonical:
+        return redirect(url_for('area_venues', state=canonical[0], city=canonical[1],
+                                **request.args), 301)
+    snapshot = catalogue.current()
+    result = (snapshot or readmodels).area_venues(state, city, page)
+    if snapshot is not None and (result is None or page > result[1].pages):
+        result = readmodels.area_venues(state, city, page)
+    if result is None or page > result[1].pages:
+        abort(404)
+    area, pagination = result
+    return render_template('pages/area_venues.html', area=area, pagination=pagination)
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
     search = request.form.get('search_term', '')
-    search_result = Venue.query.filter(Venue.name.ilike(f'%{search}%'))
+    search_result = readmodels.search_venues(search)
     response = {
-        "count": search_result.count(),
+        "count": len(search_result),
         "data": search_result
     }
 
@@ -113,34 +244,38 @@ def search_venues():
                            search_term=request.form.get('search_term', ''))
 
 
+@app.route('/venues/autocomplete')
+def autocomplete_venues():
+    return autocomplete('venue', readmodels.search_venues)
+
+
+def autocomplete(kind, search, limit=10):
+    term = request.args.get('q', '').strip()
+    if not term:
+        return jsonify(data=[])
+    snapshot = catalogue.current()
+    if snapshot is None:
+        # No snapshot built yet: names only, straight from the database.
+        return jsonify(data=[listing._asdict() for listing in search(term)[:limit]])
+    return jsonify(data=snapshot.autocomplete(kind, term, limit))
+
+
+@app.route('/venues/<int:venue_id>/shows.ics')
+def venue_calendar(venue_id):
+    venue = readmodels.get_venue(venue_id)
+    if venue is None:
+        abort(404)
+    return calendar_feed(f'{venue.name} shows', Show.venue_id == venue_id)
+
+
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
-    shows = db.session.query(Show).join(Venue).filter(venue_id == Show.venue_id)
-    past_shows = []
-    upcoming_shows = []
-
-    for show in shows:
-        temp_show = {
-            'artist_id': show.artist_id,
-            'artist_name': show.Artist.name,
-            'artist_image_link': show.Artist.image_link,
-            'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        if show.start_time <= datetime.now():
-            past_shows.append(temp_show)
-        else:
-            upcoming_shows.append(temp_show)
-
-    # object class to dict
-    data = vars(venue)
-
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
-
-    return render_template('pages/show_venue.html', venue=data)
+    venue = readmodels.venue_detail(venue_id)
+    if venue is None:
+        abort(404)
+    views.record('venue', venue_id)
+
+    return render_template('pages/show_venue.html', venue=venue)
 
 
 #  Create Venue
@@ -156,23 +291,11 @@ def create_venue_form():
 def create_venue_submission():
     form = VenueForm(request.form, meta={'csrf': False})
     if form.validate_on_submit():
+        values = writes.venue_values(form)
+        if write_queue is not None:
+            return queue_write('Venue ' + values['name'] + ' is being listed.', 'create_venue', values)
         try:
-            add_venue = Venue(
-                name=form.name.data,
-                city=form.city.data,
-                state=form.state.data,
-                address=form.address.data,
-                phone=form.phone.data,
-                image_link=form.image_link.data,
-                facebook_link=form.facebook_link.data,
-                genres=form.genres.data,
-                website=form.website_link.data,
-                seeking_talent=form.seeking_talent.data,
-                seeking_description=form.seeking_description.data
-            )
-            print(form.genres)
-
-            db.session.add(add_venue)
+            writes.create_venue(values)
             db.session.commit()
             flash('Venue ' + request.form['name'] + ' was successfully listed!')
         except Exception as e:
@@ -183,47 +306,48 @@ def create_venue_submission():
     else:
         for error in form.errors:
             flash(error)
-    return render_template('pages/home.html')
+    return render_home()
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
+    if write_queue is not None:
+        return queue_write('Venue ' + str(venue_id) + ' is being deleted.', 'delete_venues', [venue_id])
     try:
-        venue_del = Venue.query.filter(Venue.id == venue_id).first()
-        name_del = venue_del.name
-        db.session.delete(venue_del)
+        deleted = writes.delete_venues([venue_id])
         db.session.commit()
-        flash('Venue ' + name_del + ' was deleted successfully.')
+        flash('Venue ' + deleted[venue_id] + ' was deleted successfully.')
     except:
         db.session.rollback()
-        flash('Venue ' + name_del + ' could not be deleted.')
+        flash('Venue ' + str(venue_id) + ' could not be deleted.')
     finally:
         db.session.close()
 
-    return render_template('pages/home.html')
+    return render_home()
+
+
+@app.route('/venues', methods=['DELETE'])
+def delete_venues():
+    return delete_many('delete_venues', requested_ids())
 
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    data = []
-    artists = Artist.query.all()
-    for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name
-        })
-
-    return render_template('pages/artists.html', artists=data)
+    snapshot = catalogue.current()
+    listing = snapshot.artist_list() if snapshot else []
+    if not listing:
+        listing = readmodels.artist_list()
+    return render_template('pages/artists.html', artists=listing, popular=views.popular('artist'))
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
     search = request.form.get('search_term', '')
-    search_result = Artist.query.filter(Artist.name.ilike(f'%{search}%'))
+    search_result = readmodels.search_artists(search)
     response = {
-        "count": search_result.count(),
+        "count": len(search_result),
         "data": search_result
     }
 
@@ -231,74 +355,65 @@ def search_artists():
                            search_term=request.form.get('search_term', ''))
 
 
+@app.route('/artists/autocomplete')
+def autocomplete_artists():
+    return autocomplete('artist', readmodels.search_artists)
+
+
+@app.route('/artists/<int:artist_id>/shows.ics')
+def artist_calendar(artist_id):
+    artist = readmodels.get_artist(artist_id)
+    if artist is None:
+        abort(404)
+    return calendar_feed(f'{artist.name} shows', Show.artist_id == artist_id)
+
+
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
-    shows = db.session.query(Show).join(Artist).filter(artist_id == Show.artist_id)
-    past_shows = []
-    upcoming_shows = []
-
-    for show in shows:
-        temp_show = {
-            'venue_id': show.venue_id,
-            'venue_name': show.Venue.name,
-            'venue_image_link': show.Venue.image_link,
-            'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        if show.start_time <= datetime.now():
-            past_shows.append(temp_show)
-        else:
-            upcoming_shows.append(temp_show)
-
-    # object class to dict
-    data = vars(artist)
-
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
-
-    return render_template('pages/show_artist.html', artist=data)
+    artist = readmodels.artist_detail(artist_id)
+    if artist is None:
+        abort(404)
+    views.record('artist', artist_id)
+
+    return render_template('pages/show_artist.html', artist=artist)
 
 
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-    get_artist = Artist.query.filter_by(id=artist_id).first()
-    artist = {
-        "id": get_artist.id,
-        "name": get_artist.name,
-        "genres": get_artist.genres,
-        "city": get_artist.city,
-        "state": get_artist.state,
-        "phone": get_artist.phone,
-        "website": get_artist.website,
-        "facebook_link": get_artist.facebook_link,
-        "seeking_venue": get_artist.seeking_venue,
-        "seeking_description": get_artist.seeking_description,
-        "image_link": get_artist.image_link
-    }
+    artist = readmodels.get_artist(artist_id)
+    if artist is None:
+        abort(404)
+    form = ArtistForm(data=writes.form_data(artist))
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
+    form = ArtistForm(request.form, meta={'csrf': False})
+    name = form.name.data
+    version = form.version.data
+    if version is None:
+        abort(400)
+    if not form.validate():
+        artist = readmodels.get_artist(artist_id)
+        if artist is None:
+            abort(404)
+        for error in form.errors:
+            flash(error)
+        return render_template('forms/edit_artist.html', form=form, artist=artist), 400
+    values = writes.artist_values(form)
+    if write_queue is not None:
+        return queue_write('Artist ' + name + ' is being updated.', 'update_artist', artist_id, version, values)
     try:
-        form = ArtistForm()
-        artist_edit = Artist.query.get(artist_id)
-        name = form.name.data
-        artist_edit.name = name
-        artist_edit.city = form.city.data
-        artist_edit.state = form.state.data
-        artist_edit.phone = form.phone.data
-        artist_edit.image_link = form.image_link.data
-        artist_edit.facebook_link = form.facebook_link.data
-
+        writes.update_artist(artist_id, version, values)
         db.session.commit()
         flash('Artist ' + request.form['name'] + ' successfully updated')
+    except writes.Conflict:
+        db.session.rollback()
+        return edit_conflict('artist', readmodels.get_artist(artist_id), ArtistForm)
     except:
         db.session.rollback()
         flash('Artist ' + name + ' could not been updated')
@@ -308,47 +423,50 @@ def edit_artist_submission(artist_id):
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
+def edit_conflict(kind, current, form_class):
+    # Show the saved values and version so the user can reapply their edit.
+    if current is None:
+        abort(404)
+    flash(f'{current.name} was changed by someone else while you were editing. '
+          'These are the saved values; make your changes again and save.')
+    form = form_class(formdata=None, data=writes.form_data(current))
+    return render_template(f'forms/edit_{kind}.html', form=form, **{kind: current}), 409
+
+
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
-    get_venue = Venue.query.filter_by(id=venue_id).first()
-    venue = {
-        "id": get_venue.id,
-        "name": get_venue.name,
-        "genres": get_venue.genres,
-        "address": get_venue.address,
-        "city": get_venue.city,
-        "state": get_venue.state,
-        "phone": get_venue.phone,
-        "website": get_venue.website,
-        "facebook_link": get_venue.facebook_link,
-        "seeking_talent": get_venue.seeking_talent,
-        "seeking_description": get_venue.seeking_description,
-        "image_link": get_venue.image_link
-    }
+    venue = readmodels.get_venue(venue_id)
+    if venue is None:
+        abort(404)
+    form = VenueForm(data=writes.form_data(venue))
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
+    form = VenueForm(request.form, meta={'csrf': False})
+    name = form.name.data
+    version = form.version.data
+    if version is None:
+        abort(400)
+    if not form.validate():
+        venue = readmodels.get_venue(venue_id)
+        if venue is None:
+            abort(404)
+        for error in form.errors:
+            flash(error)
+        return render_template('forms/edit_venue.html', form=form, venue=venue), 400
+    values = writes.venue_values(form)
+    if write_queue is not None:
+        return queue_write('Venue ' + name + ' is being updated.', 'update_venue', venue_id, version, values)
     try:
-        form = VenueForm()
-        venue_edit = Venue.query.get(venue_id)
-        name = form.name.data
-        venue_edit.name = name
-        venue_edit.city = form.city.data
-        venue_edit.state = form.state.data
-        venue_edit.address = form.address.data
-        venue_edit.phone = form.phone.data
-        venue_edit.image_link = form.image_link.data
-        venue_edit.facebook_link = form.facebook_link.data
-        venue_edit.website = form.website_link.data
-        venue_edit.seeking_talent = form.seeking_talent.data
-        venue_edit.seeking_description = form.seeking_description.data
-
+        writes.update_venue(venue_id, version, values)
         db.session.commit()
         flash('Venue ' + request.form['name'] + ' successfully updated')
+    except writes.Conflict:
+        db.session.rollback()
+        return edit_conflict('venue', readmodels.get_venue(venue_id), VenueForm)
     except:
         db.session.rollback()
         flash('Venue ' + name + ' could not been updated')
@@ -371,20 +489,11 @@ def create_artist_form():
 def create_artist_submission():
     form = ArtistForm(request.form, meta={'csrf': False})
     if form.validate_on_submit():
+        values = writes.artist_values(form)
+        if write_queue is not None:
+            return queue_write('Artist ' + values['name'] + ' is being listed.', 'create_artist', values)
         try:
-            add_artist = Artist(
-                name=form.name.data,
-                city=form.city.data,
-                state=form.state.data,
-                phone=form.phone.data,
-                genres=form.genres.data,
-                image_link=form.image_link.data,
-                facebook_link=form.facebook_link.data,
-                website=form.website_link.data,
-                seeking_venue=form.seeking_venue.data,
-                seeking_description=form.seeking_description.data
-            )
-            db.session.add(add_artist)
+            writes.create_artist(values)
             db.session.commit()
             flash('Artist ' + request.form['name'] + ' was successfully listed!')
 
@@ -397,47 +506,96 @@ def create_artist_submission():
         for error in form.errors:
             flash(error)
 
-    return render_template('pages/home.html')
+    return render_home()
 
 
-@app.route('/artist/<artist_id>', methods=['DELETE'])
+@app.route('/artist/<int:artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
+    if write_queue is not None:
+        return queue_write('Artist ' + str(artist_id) + ' is being deleted.', 'delete_artists', [artist_id])
     try:
-        artist_del = Artist.query.filter(Artist.id == artist_id).first()
-        name_del = artist_del.name
-        db.session.delete(artist_del)
+        deleted = writes.delete_artists([artist_id])
         db.session.commit()
-
-        flash('Venue ' + name_del + ' was deleted successfully.')
+        flash('Artist ' + deleted[artist_id] + ' was deleted successfully.')
     except:
         db.session.rollback()
-        flash('Venue ' + name_del + ' could not be deleted.')
+        flash('Artist ' + str(artist_id) + ' could not be deleted.')
     finally:
         db.session.close()
-    return render_template('pages/home.html')
+    return render_home()
+
+
+@app.route('/artists', methods=['DELETE'])
+def delete_artists():
+    return delete_many('delete_artists', requested_ids())
+
+
+def requested_ids():
+    """IDs for a bulk delete, from a JSON body ``{"ids": [...]}`` or form fields."""
+    data = request.get_json(silent=True)
+    if data is None:
+        ids = request.form.getlist('ids')
+    elif isinstance(data, dict) and isinstance(data.get('ids'), list):
+        ids = data['ids']
+    else:
+        abort(400)
+    try:
+        return [int(i) for i in ids]
+    except (TypeError, ValueError):
+        abort(400)
+
+
+def delete_many(kind, ids):
+    if write_queue is not None:
+        job_id = write_queue.enqueue(kind, ids)
+        return jsonify(job=url_for('job_status', job_id=job_id)), 202
+    try:
+        deleted = writes.APPLY[kind](ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    return jsonify(deleted=sorted(deleted))
 
 
 #  Shows
 #  ----------------------------------------------------------------
 
+def requested_show_filters():
+    try:
+        return readmodels.parse_show_filters(request.args)
+    except ValueError:
+        abort(400)
+
+
 @app.route('/shows')
 def shows():
-    data = []
-    shows = db.session.query(Show).join(Artist).all()
-    # shows = Show.query.all()
-    for show in shows:
-        venue_query = Venue.query.filter_by(id=show.venue_id).first()
-        artist_query = Artist.query.filter_by(id=show.artist_id).first()
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": venue_query.name,
-            "artist_id": show.artist_id,
-            "artist_name": artist_query.name,
-            "artist_image_link": artist_query.image_link,
-            "start_time": str(show.start_time)
-        })
-
-    return render_template('pages/shows.html', shows=data)
+    filters = requested_show_filters()
+    return render_template('pages/shows.html', shows=readmodels.show_list(filters), genres=GENRES)
+
+
+@app.route('/shows/calendar')
+def show_calendar():
+    filters = requested_show_filters()
+    try:
+        month = datetime.strptime(request.args['month'], '%Y-%m').date()
+    except KeyError:
+        month = date.today().replace(day=1)
+    except ValueError:
+        abort(400)
+    # City, state and genre carry over to the month links and day listings.
+    query = urlencode({name: request.args[name] for name in ('city', 'state', 'genre')
+                       if request.args.get(name)})
+    return render_template('pages/calendar.html', calendar=readmodels.month_calendar(month, filters),
+                           query=query, genres=GENRES)
+
+
+def calendar_feed(name, condition):
+    since = datetime.now() - ical.FEED_HISTORY
+    body = ical.feed(name, readmodels.feed_shows(condition, since), request.host_url)
+    return Response(body, mimetype='text/calendar')
 
 
 @app.route('/shows/create')
@@ -449,23 +607,52 @@ def create_shows():
 
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
-    try:
-        form = ShowForm()
-        show = Show(
-            start_time=form.start_time.data,
-            venue_id=form.venue_id.data,
-            artist_id=form.artist_id.data,
-        )
-        db.session.add(show)
-        db.session.commit()
-        flash('Show was successfully listed!')
-    except:
-        db.session.rollback()
-        flash('An error occurred. Show could not be listed.')
-    finally:
-        db.session.close()
+    form = ShowForm(request.form, meta={'csrf': False})
+    if form.validate():
+        values = writes.show_values(form)
+        if write_queue is not None:
+            return queue_write('Show is being listed.', 'create_show', values)
+        try:
+            writes.create_show(values)
+            db.session.commit()
+            flash('Show was successfully listed!')
+        except:
+            db.session.rollback()
+            flash('An error occurred. Show could not be listed.')
+        finally:
+            db.session.close()
+    else:
+        for error in form.errors:
+            flash(error)
+
+    return render_home()
+
+
+#  Profiles
+#  ----------------------------------------------------------------
+
+def authorize_profiles():
+    # Same signed token as for profiling a request, issued for /_profiles.
+    token = request.headers.get('X-Fyyur-Profile') or request.args.get('token')
+    if not app.config['PROFILE_DIR'] or not profiling.verify_token(
+            app.config['PROFILE_SECRET'], '/_profiles', token):
+        abort(404)
+
+
+@app.route('/_profiles')
+def profiles():
+    authorize_profiles()
+    return render_template('pages/profiles.html',
+                           routes=profiling.slowest_by_route(app.config['PROFILE_DIR']),
+                           token=request.args.get('token', ''))
+
 
-    return render_template('pages/home.html')
+@app.route('/_profiles/<path:filename>')
+def profile_file(filename):
+    authorize_profiles()
+    if filename == profiling.INDEX:
+        abort(404)
+    return send_from_directory(app.config['PROFILE_DIR'], filename, as_attachment=True)
 
 
 @app.errorhandler(404)
@@ -494,7 +681,7 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    warmed_app().run()
 
 # Or specify port manually:
 '''
@@ -0,0 +1,32 @@
+"""ASGI entry point: async read pages from Quart, everything else from Flask.
+
+Run with any ASGI server, for example:
+
+    uvicorn asgi:application --workers 4
+
+GET requests for the listing and detail pages and POSTs to the search
+endpoints are served by ``async_app``; forms, writes, static files and
+any other route go to the WSGI Flask app through ``WsgiToAsgi``.
+"""
+import re
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app
+from async_app import app as async_app
+
+ASYNC_ROUTES = {
+    'GET': re.compile(r'^/(venues|artists|shows)(/\d+)?/?$'),
+    'POST': re.compile(r'^/(venues|artists)/search/?$'),
+}
+
+wsgi_application = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        pattern = ASYNC_ROUTES.get(scope['method'])
+        if pattern is None or not pattern.match(scope['path']):
+            return await wsgi_application(scope, receive, send)
+    # Lifespan events go to Quart so it can open and close its engine.
+    return await async_app(scope, receive, send)
@@ -0,0 +1,233 @@
+"""Async (Quart) variant of the read-heavy pages, backed by an AsyncSession.
+
+Only the listing, search and detail pages live here; ``asgi.py`` routes
+everything else to the regular Flask app. Endpoint names match the Flask
+views so templates and ``request.endpoint`` checks work unchanged, and
+``url_for`` falls back to the Flask URL map for endpoints defined only
+there.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from jinja2 import FileSystemBytecodeCache
+from quart import Quart, render_template, request, abort, g
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import admission
+from app import app as flask_app, catalogue, start_services, views
+from forms import GENRES
+from fragments import FragmentCacheExtension
+from models import Venue, Artist, Show
+import readmodels
+from readmodels import ShowView, Listing
+
+app = Quart(__name__)
+app.config.from_object('config')
+app.jinja_env.add_extension(FragmentCacheExtension)
+# Async templates compile to different code, so they need their own cache.
+os.makedirs(os.path.join(app.config['JINJA_BYTECODE_CACHE_DIR'], 'async'), exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+    os.path.join(app.config['JINJA_BYTECODE_CACHE_DIR'], 'async'))
+
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_uri(uri):
+    scheme, rest = uri.split('://', 1)
+    return ASYNC_DRIVERS.get(scheme, scheme) + '://' + rest
+
+
+engine = None
+Session = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+@app.before_serving
+async def open_engine():
+    global engine
+    uri = app.config['ASYNC_DATABASE_URI'] or async_database_uri(
+        app.config['SQLALCHEMY_DATABASE_URI'])
+    options = {} if uri.startswith('sqlite') else {'pool_size': app.config['ASYNC_POOL_SIZE']}
+    engine = create_async_engine(uri, **options)
+    Session.configure(bind=engine)
+    # Filters and helpers registered on the Flask app are needed by the same templates.
+    app.jinja_env.filters.update(flask_app.jinja_env.filters)
+    for name, value in flask_app.jinja_env.globals.items():
+        app.jinja_env.globals.setdefault(name, value)
+    # The Flask app's background threads (snapshot refresher, dashboard) run
+    # in this process too, not only once a request reaches a Flask route.
+    start_services()
+
+
+@app.after_serving
+async def close_engine():
+    await engine.dispose()
+
+
+_flask_urls = flask_app.url_map.bind('')
+
+
+def build_flask_url(error, endpoint, values):
+    return _flask_urls.build(endpoint, values)
+
+
+app.url_build_error_handlers.append(build_flask_url)
+
+# Same policies as the Flask app. SQLite bucket updates are short enough to
+# run on the event loop.
+buckets = admission.buckets_for(app.config)
+concurrency_limits = {policy: admission.AsyncConcurrencyLimit(*spec)
+                      for policy, spec in app.config['CONCURRENCY_LIMITS'].items()}
+
+
+@app.before_request
+async def admit():
+    policy = admission.check_rate(buckets, app.config, request.endpoint, request.remote_addr)
+    if policy in concurrency_limits:
+        await concurrency_limits[policy].acquire()
+        g.admission_limit = concurrency_limits[policy]
+
+
+@app.teardown_request
+async def release(exc):
+    limit = g.pop('admission_limit', None)
+    if limit is not None:
+        await limit.release()
+
+
+async def fetch_all(statement):
+    # One session per statement, so independent queries can run concurrently.
+    async with Session() as session:
+        return (await session.execute(statement)).all()
+
+
+# ----------------------------------------------------------------------------#
+# Controllers.
+# ----------------------------------------------------------------------------#
+
+@app.route('/venues')
+async def venues():
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        abort(404)
+    snapshot = catalogue.current()
+    if snapshot is not None:
+        areas, pagination = snapshot.area_index(page)
+    if snapshot is None or page > pagination.pages:
+        # No snapshot yet, or it may not have the newest areas.
+        snapshot = None
+        areas, pagination = await area_index(page)
+    if page > pagination.pages:
+        abort(404)
+    return await render_template('pages/venues.html', areas=areas, pagination=pagination,
+                                 popular=views.popular('venue') if page == 1 else [],
+                                 snapshot_built_at=snapshot.built_at if snapshot else None)
+
+
+async def area_index(page, per_page=readmodels.AREAS_PER_PAGE):
+    total, locations = await asyncio.gather(
+        fetch_all(readmodels.area_count_select()),
+        fetch_all(readmodels.area_index_select((page - 1) * per_page, per_page)))
+    venues = []
+    if locations:
+        venues = await fetch_all(readmodels.area_preview_select(
+            [row.id for row in locations], datetime.now(), readmodels.AREA_PREVIEW))
+    return (readmodels.build_area_index(locations, venues),
+            readmodels.Page(page, readmodels.page_count(total[0][0], per_page)))
+
+
+@app.route('/venues/search', methods=['POST'])
+async def search_venues():
+    search = (await request.form).get('search_term', '')
+    rows = await fetch_all(readmodels.search_select(Venue, search))
+    results = [Listing._make(row) for row in rows]
+    return await render_template('pages/search_venues.html',
+                                 results={'count': len(results), 'data': results},
+                                 search_term=search)
+
+
+@app.route('/venues/<int:venue_id>')
+async def show_venue(venue_id):
+    venue = await entity_detail(readmodels.venue_select(venue_id), Show.venue_id == venue_id,
+                                readmodels.VenueDetail)
+    if venue is None:
+        abort(404)
+    views.record('venue', venue_id)
+    return await render_template('pages/show_venue.html', venue=venue)
+
+
+@app.route('/artists')
+async def artists():
+    snapshot = catalogue.current()
+    listing = snapshot.artist_list() if snapshot else []
+    if not listing:
+        listing = [Listing._make(row) for row in await fetch_all(readmodels.artist_list_select())]
+    return await render_template('pages/artists.html', artists=listing,
+                                 popular=views.popular('artist'))
+
+
+@app.route('/artists/search', methods=['POST'])
+async def search_artists():
+    search = (await request.form).get('search_term', '')
+    rows = await fetch_all(readmodels.search_select(Artist, search))
+    results = [Listing._make(row) for row in rows]
+    return await render_template('pages/search_artists.html',
+                                 results={'count': len(results), 'data': results},
+                                 search_term=search)
+
+
+@app.route('/artists/<int:artist_id>')
+async def show_artist(artist_id):
+    artist = await entity_detail(readmodels.artist_select(artist_id), Show.artist_id == artist_id,
+                                 readmodels.ArtistDetail)
+    if artist is None:
+        abort(404)
+    views.record('artist', artist_id)
+    return await render_template('pages/show_artist.html', artist=artist)
+
+
+@app.route('/shows')
+async def shows():
+    try:
+        filters = readmodels.parse_show_filters(request.args)
+    except ValueError:
+        abort(400)
+    rows = await fetch_all(readmodels.filter_shows(readmodels.shows_select(), filters))
+    return await render_template('pages/shows.html', shows=[ShowView._make(row) for row in rows],
+                                 genres=GENRES)
+
+
+async def entity_detail(entity_select, shows_filter, detail):
+    """Run the entity lookup and the past/upcoming show queries concurrently."""
+    now = datetime.now()
+    shows = readmodels.shows_select().where(shows_filter)
+    entity, past, upcoming = await asyncio.gather(
+        fetch_all(entity_select),
+        fetch_all(shows.where(Show.start_time <= now)),
+        fetch_all(shows.where(Show.start_time > now)),
+    )
+    if not entity:
+        return None
+    past_shows = [ShowView._make(row) for row in past]
+    upcoming_shows = [ShowView._make(row) for row in upcoming]
+    return detail(*entity[0], past_shows, upcoming_shows, len(past_shows), len(upcoming_shows))
+
+
+@app.errorhandler(admission.Overloaded)
+async def overloaded(error):
+    return error.response()
+
+
+@app.errorhandler(404)
+async def not_found_error(error):
+    return await render_template('errors/404.html'), 404
+
+
+@app.errorhandler(500)
+async def server_error(error):
+    return await render_template('errors/500.html'), 500
@@ -0,0 +1,71 @@
+"""Compare allocations of ORM entity loading against the column-only read models.
+
+Runs each listing-page data builder against the configured database and
+reports peak traced memory and wall time, e.g.:
+
+    python benchmarks/bench_readmodels.py --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+import readmodels  # noqa: E402
+
+
+def orm_venues():
+    return [(venue.city, venue.state, venue.id, venue.name, len(venue.shows))
+            for venue in Venue.query.all()]
+
+
+def orm_artists():
+    return [(artist.id, artist.name) for artist in Artist.query.all()]
+
+
+def orm_shows():
+    return [(show.id, show.start_time, show.Venue.name, show.Artist.name, show.Artist.image_link)
+            for show in Show.query.all()]
+
+
+CASES = [
+    ('venues', orm_venues, lambda: readmodels.area_index(1, sys.maxsize, sys.maxsize)),
+    ('artists', orm_artists, readmodels.artist_list),
+    ('shows', orm_shows, readmodels.show_list),
+]
+
+
+def measure(func, repeat):
+    peak = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        db.session.remove()
+        tracemalloc.start()
+        func()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak, (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'page':<10}{'orm peak KiB':>14}{'view peak KiB':>15}{'saved':>8}"
+          f"{'orm ms':>10}{'view ms':>10}")
+    with app.app_context():
+        for name, orm_func, view_func in CASES:
+            orm_peak, orm_time = measure(orm_func, args.repeat)
+            view_peak, view_time = measure(view_func, args.repeat)
+            saved = 1 - view_peak / orm_peak if orm_peak else 0
+            print(f"{name:<10}{orm_peak / 1024:>14.1f}{view_peak / 1024:>15.1f}{saved:>8.0%}"
+                  f"{orm_time * 1000:>10.2f}{view_time * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
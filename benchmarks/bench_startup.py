@@ -0,0 +1,77 @@
+"""Measure worker boot cost: per-module import time and time to first request.
+
+Import times come from parsing ``python -X importtime -c "import app"``;
+time to first request is measured in a fresh interpreter from the start of
+the import until the test client has served ``--path``, e.g.:
+
+    python benchmarks/bench_startup.py --top 15 --runs 5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+FIRST_REQUEST = '''
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.warmed_app()
+booted = time.perf_counter()
+response = application.test_client().get({path!r})
+served = time.perf_counter()
+print(imported - started, booted - imported, served - booted, response.status_code)
+'''
+
+
+def import_times():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+def first_request(path):
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST.format(path=path)],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    imported, booted, served, status = result.stdout.split()[-4:]
+    return float(imported), float(booted), float(served), int(status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', default='/venues')
+    args = parser.parse_args()
+
+    modules = import_times()
+    total = max(cumulative for _, _, cumulative, _ in modules)
+    print(f'total import time of app: {total / 1000:.1f} ms\n')
+    print(f"{'top-level imports by cumulative time':<50}{'cumul ms':>10}{'self ms':>10}")
+    top_level = [m for m in modules if m[3] <= 1]
+    for name, self_us, cumulative_us, _ in sorted(top_level, key=lambda m: -m[2])[:args.top]:
+        print(f'{name:<50}{cumulative_us / 1000:>10.1f}{self_us / 1000:>10.1f}')
+    print(f"\n{'modules by self time':<50}{'self ms':>10}")
+    for name, self_us, _, _ in sorted(modules, key=lambda m: -m[1])[:args.top]:
+        print(f'{name:<50}{self_us / 1000:>10.1f}')
+
+    runs = [first_request(args.path) for _ in range(args.runs)]
+    print(f'\ntime to first request ({args.path}, median of {args.runs}, status {runs[-1][3]}):')
+    for label, index in (('import', 0), ('warm-up', 1), ('first request', 2)):
+        print(f'  {label:<14}{statistics.median(run[index] for run in runs) * 1000:>8.1f} ms')
+    print(f"  {'total':<14}{statistics.median(sum(run[:3]) for run in runs) * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
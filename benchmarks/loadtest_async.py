@@ -0,0 +1,114 @@
+"""Load-test the sync WSGI app against the ASGI/async variant at equal worker counts.
+
+Starts gunicorn (``app:app``, sync workers) and uvicorn
+(``asgi:application``) with the same number of workers against the
+configured database and with admission control off, drives each with
+the same concurrent client for a fixed duration and prints throughput and
+latency percentiles, e.g.:
+
+    python benchmarks/loadtest_async.py --workers 4 --concurrency 32 --duration 20
+"""
+import argparse
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    # -c /dev/null: not the deployment's gunicorn.conf.py in ROOT, whose
+    # threaded workers would make the worker counts unequal.
+    'wsgi': ['gunicorn', '-c', '/dev/null', '--workers', '{workers}', '--worker-class', 'sync',
+             '--bind', '127.0.0.1:{port}', 'app:app'],
+    'asgi': ['uvicorn', '--workers', '{workers}', '--port', '{port}', '--log-level', 'warning',
+             'asgi:application'],
+}
+# All load comes from this one client, so rate limits would reject most of it.
+SERVER_ENV = dict(os.environ, FYYUR_ADMISSION_CONTROL='0')
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {url} did not start')
+
+
+def drive(base_url, paths, concurrency, duration):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    targets = itertools.cycle(paths)
+    deadline = time.monotonic() + duration
+
+    def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            with lock:
+                path = next(targets)
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(base_url + path, timeout=30).read()
+                failed = False
+            except (urllib.error.URLError, ConnectionError):
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def report(name, latencies, errors, duration):
+    if not latencies:
+        print(f'{name:<6} no responses')
+        return
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000  # noqa: E731
+    print(f'{name:<6}{len(latencies) / duration:>10.1f}{statistics.mean(latencies) * 1000:>10.1f}'
+          f'{pct(0.5):>10.1f}{pct(0.95):>10.1f}{pct(0.99):>10.1f}{errors:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--paths', nargs='+',
+                        default=['/venues', '/shows', '/venues/1', '/artists/1'])
+    args = parser.parse_args()
+
+    print(f"{'mode':<6}{'req/s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for offset, (name, command) in enumerate(SERVERS.items()):
+        port = args.port + offset
+        command = [part.format(workers=args.workers, port=port) for part in command]
+        server = subprocess.Popen(command, cwd=ROOT, env=SERVER_ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            wait_until_up(base_url + args.paths[0])
+            latencies, errors = drive(base_url, args.paths, args.concurrency, args.duration)
+            report(name, latencies, errors, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""Replay a captured request log against a local server and report per route.
+
+Record real traffic with the capture middleware, then replay it at a chosen
+concurrency and rate, with threads or asyncio, e.g.:
+
+    FYYUR_CAPTURE_PATH=traffic.jsonl gunicorn 'app:warmed_app()'
+    python benchmarks/replay.py traffic.jsonl --url http://127.0.0.1:8000 --concurrency 16
+    python benchmarks/replay.py traffic.jsonl --serve asgi --workers 4 --rate 200 --loop --duration 30
+    python benchmarks/replay.py traffic.jsonl --mode asyncio --speed 2
+
+Pacing: ``--rate`` sends at a fixed number of requests per second,
+``--speed`` keeps the recorded gaps between requests (divided by the
+factor), and with neither each client sends its next request as soon as
+the previous one returns. When paced, latency is measured from the
+scheduled send time, so time spent queued behind a slow server counts.
+
+Requests are grouped into routes by method and path with numeric segments
+replaced by ``<id>``. Errors are 5xx responses and failed connections.
+Non-GET requests are replayed too and write to the target database; pass
+``--read-only`` to leave them out. Servers started with ``--serve`` run
+with admission control off, as all replayed traffic comes from one
+address; start a server given with ``--url`` with
+``FYYUR_ADMISSION_CONTROL=0`` for the same.
+"""
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from loadtest_async import ROOT, SERVER_ENV, SERVERS, wait_until_up
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+READ_METHODS = ('GET', 'HEAD')
+
+
+# ----------------------------------------------------------------------------#
+# Request log.
+# ----------------------------------------------------------------------------#
+
+def load(path, read_only=False, exclude=None):
+    records = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('body') is None:
+                continue
+            if read_only and record['method'] not in READ_METHODS:
+                continue
+            if exclude and re.search(exclude, record['path']):
+                continue
+            records.append(record)
+    return records
+
+
+def route(record):
+    return f"{record['method']} {re.sub(r'/[0-9]+(?=/|$)', '/<id>', record['path'])}"
+
+
+def schedule(records, rate=None, speed=None, loop=False):
+    """Yield ``(offset, record)``; ``offset`` is None when unpaced."""
+    if rate:
+        offsets = (i / rate for i in itertools.count())
+    elif speed:
+        first = records[0]['t']
+        # The recorded span plus one average gap, so loops do not overlap.
+        span = (records[-1]['t'] - first) * len(records) / max(len(records) - 1, 1)
+        offsets = ((lap * span + record['t'] - first) / speed
+                   for lap in itertools.count() for record in records)
+    else:
+        offsets = itertools.repeat(None)
+    source = itertools.cycle(records) if loop else iter(records)
+    return zip(offsets, source)
+
+
+# ----------------------------------------------------------------------------#
+# Results.
+# ----------------------------------------------------------------------------#
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def add(self, elapsed, status):
+        self.latencies.append(elapsed)
+        key = f'{status // 100}xx' if status else 'failed'
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        self.errors += status is None or status >= 500
+
+
+class Results:
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def add(self, record, elapsed, status):
+        with self._lock:
+            self.routes.setdefault(route(record), Stats()).add(elapsed, status)
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+
+def histogram(latencies, width=40):
+    counts = [0] * len(BUCKETS)
+    bucket = 0
+    for latency in latencies:
+        while latency * 1000 > BUCKETS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    peak = max(counts)
+    lines = []
+    lower = 0
+    for upper, count in zip(BUCKETS, counts):
+        if count:
+            label = f'{lower:g}-{upper:g} ms' if upper != float('inf') else f'>{lower:g} ms'
+            lines.append(f'    {label:>14} {count:>8} {"#" * max(1, count * width // peak)}')
+        lower = upper
+    return lines
+
+
+def report(results, elapsed):
+    total = Stats()
+    print(f"{'route':<36}{'count':>8}{'req/s':>9}{'err %':>7}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses")
+    for name, stats in sorted(results.routes.items(), key=lambda item: -len(item[1].latencies)):
+        _report_line(name, stats, elapsed)
+        total.latencies.extend(stats.latencies)
+        total.errors += stats.errors
+        for key, count in stats.statuses.items():
+            total.statuses[key] = total.statuses.get(key, 0) + count
+    if not total.latencies:
+        print('no requests sent')
+        return
+    _report_line('total', total, elapsed)
+    for name, stats in sorted(results.routes.items()):
+        print(f'\n{name}')
+        print('\n'.join(histogram(stats.latencies)))
+
+
+def _report_line(name, stats, elapsed):
+    latencies = sorted(stats.latencies)
+    stats.latencies = latencies
+    statuses = ' '.join(f'{key}={count}' for key, count in sorted(stats.statuses.items()))
+    print(f'{name[:35]:<36}{len(latencies):>8}{len(latencies) / elapsed:>9.1f}'
+          f'{stats.errors * 100 / len(latencies):>7.1f}{percentile(latencies, 0.5):>9.1f}'
+          f'{percentile(latencies, 0.95):>9.1f}{percentile(latencies, 0.99):>9.1f}'
+          f'{latencies[-1] * 1000:>9.1f}  {statuses}')
+
+
+# ----------------------------------------------------------------------------#
+# Clients.
+# ----------------------------------------------------------------------------#
+
+def target(record):
+    return record['path'] + (f"?{record['query']}" if record['query'] else '')
+
+
+def request_headers(record, body):
+    headers = {'Content-Length': str(len(body))}
+    if record['content_type']:
+        headers['Content-Type'] = record['content_type']
+    return headers
+
+
+def run_threads(base_url, jobs, concurrency, deadline, results):
+    host = urlsplit(base_url).netloc
+    lock = threading.Lock()
+    started = time.monotonic()
+
+    def client():
+        connection = http.client.HTTPConnection(host, timeout=30)
+        while time.monotonic() < deadline:
+            with lock:
+                job = next(jobs, None)
+            if job is None:
+                break
+            offset, record = job
+            sent = time.monotonic()
+            if offset is not None:
+                sent = started + offset
+                time.sleep(max(0, sent - time.monotonic()))
+            body = record['body'].encode('utf-8')
+            try:
+                connection.request(record['method'], target(record), body=body,
+                                   headers=request_headers(record, body))
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = None
+            results.add(record, time.monotonic() - sent, status)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+async def _send(host, port, record):
+    # One connection per request (``Connection: close``), read to EOF.
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = record['body'].encode('utf-8')
+        headers = dict(request_headers(record, body), Host=f'{host}:{port}', Connection='close')
+        head = f"{record['method']} {target(record)} HTTP/1.1\r\n" + ''.join(
+            f'{name}: {value}\r\n' for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+        response = await reader.read()
+        return int(response.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+def run_asyncio(base_url, jobs, concurrency, deadline, results):
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+
+    async def client(started):
+        while time.monotonic() < deadline:
+            job = next(jobs, None)
+            if job is None:
+                break
+            offset, record = job
+            sent = time.monotonic()
+            if offset is not None:
+                sent = started + offset
+                await asyncio.sleep(max(0, sent - time.monotonic()))
+            try:
+                status = await asyncio.wait_for(_send(host, port, record), 30)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            results.add(record, time.monotonic() - sent, status)
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(*(client(started) for _ in range(concurrency)))
+
+    asyncio.run(main())
+
+
+MODES = {'threads': run_threads, 'asyncio': run_asyncio}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', help='JSON lines written by the capture middleware')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--serve', choices=SERVERS, help='start a local server instead of using --url')
+    parser.add_argument('--workers', type=int, default=4, help='server workers with --serve')
+    parser.add_argument('--port', type=int, default=8700, help='server port with --serve')
+    parser.add_argument('--mode', choices=MODES, default='threads')
+    parser.add_argument('--concurrency', type=int, default=16)
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help='requests per second')
+    pacing.add_argument('--speed', type=float, help='multiple of the recorded request rate')
+    parser.add_argument('--loop', action='store_true', help='repeat the log until --duration')
+    parser.add_argument('--duration', type=float, default=float('inf'))
+    parser.add_argument('--read-only', action='store_true', help='skip non-GET requests')
+    parser.add_argument('--exclude', help='skip paths matching this regex, e.g. ^/static/')
+    args = parser.parse_args()
+
+    records = load(args.log, args.read_only, args.exclude)
+    if not records:
+        parser.error(f'no requests to replay in {args.log}')
+    if args.loop and args.duration == float('inf'):
+        parser.error('--loop needs --duration')
+
+    server = None
+    base_url = args.url
+    if args.serve:
+        command = [part.format(workers=args.workers, port=args.port) for part in SERVERS[args.serve]]
+        server = subprocess.Popen(command, cwd=ROOT, env=SERVER_ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_up(base_url + '/')
+        jobs = schedule(records, args.rate, args.speed, args.loop)
+        results = Results()
+        started = time.monotonic()
+        MODES[args.mode](base_url, jobs, args.concurrency, started + args.duration, results)
+        report(results, time.monotonic() - started)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
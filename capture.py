@@ -0,0 +1,71 @@
+"""WSGI middleware that records incoming requests for later replay.
+
+Each request becomes one JSON line appended to ``path``::
+
+    {"t": 1700000000.123, "method": "POST", "path": "/venues/search",
+     "query": "", "content_type": "application/x-www-form-urlencoded",
+     "body": "search_term=hall", "status": 200, "ms": 12.4}
+
+The file is the input of ``benchmarks/replay.py``. Lines are written with
+a single ``O_APPEND`` write each, so several worker processes can share
+one capture file.
+"""
+import io
+import json
+import os
+import time
+
+# Request bodies larger than this are not recorded (the line keeps
+# ``"body": null``); the app's forms are far smaller.
+MAX_BODY = 64 * 1024
+
+
+class RequestCapture:
+    def __init__(self, wsgi_app, path):
+        self.wsgi_app = wsgi_app
+        self.path = path
+
+    def __call__(self, environ, start_response):
+        body = self._read_body(environ)
+        started = time.time()
+        status = []
+
+        def capture_start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, capture_start_response)
+        finally:
+            self._write({
+                't': round(started, 3),
+                'method': environ['REQUEST_METHOD'],
+                'path': environ.get('PATH_INFO', '/'),
+                'query': environ.get('QUERY_STRING', ''),
+                'content_type': environ.get('CONTENT_TYPE', ''),
+                'body': body,
+                'status': status[0] if status else 500,
+                'ms': round((time.time() - started) * 1000, 1),
+            })
+
+    def _read_body(self, environ):
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if not length:
+            return ''
+        data = environ['wsgi.input'].read(length)
+        # Hand the app an unread copy of what was consumed here.
+        environ['wsgi.input'] = io.BytesIO(data)
+        if length > MAX_BODY:
+            return None
+        return data.decode('utf-8', 'replace')
+
+    def _write(self, record):
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
@@ -0,0 +1,45 @@
+"""Commit-time notifications for caches derived from the catalogue tables.
+
+Any session that flushes ORM changes or runs a bulk UPDATE/DELETE is
+marked as dirty; once it commits, every registered listener is called.
+Rolled back transactions notify nobody, so derived data is only refreshed
+for changes that actually reached the database.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_listeners = []
+
+
+def on_change(listener):
+    """Register ``listener()`` to run after each commit that changed data."""
+    _listeners.append(listener)
+    return listener
+
+
+def mark_changed(session):
+    session.info['catalogue_changed'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    if session.new or session.dirty or session.deleted:
+        mark_changed(session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mark_changed(orm_execute_state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('catalogue_changed', False):
+        for listener in _listeners:
+            listener()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('catalogue_changed', None)
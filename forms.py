@@ -1,20 +1,85 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError
+from wtforms.widgets import HiddenInput
 
+from lookups import venue_names, artist_names
+
+# ----------------------------------------------------------------------------#
+# Choices.
+# ----------------------------------------------------------------------------#
+
+# Built once at import and shared by every form instance; the frozensets
+# give O(1) validation instead of a scan of the choice list.
+STATES = (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI',
+    'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH',
+    'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN',
+    'MS', 'MO', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+    'WV', 'WI', 'WY',
+)
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+    'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+)
+
+STATE_CHOICES = tuple((state, state) for state in STATES)
+GENRE_CHOICES = tuple((genre, genre) for genre in GENRES)
+STATE_SET = frozenset(STATES)
+GENRE_SET = frozenset(GENRES)
+
+
+class RegistrySelectField(SelectField):
+    """SelectField validated by membership in ``allowed``.
+
+    ``choices`` defaults to ``allowed.choices()`` when the registry provides
+    one, such as the cached venue and artist lookups.
+    """
+
+    def __init__(self, label=None, validators=None, allowed=(), choices=None, **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.allowed = allowed
+        # Shared tuples are used as-is rather than copied per form.
+        self.choices = choices if choices is not None else allowed.choices()
+
+    def pre_validate(self, form):
+        if self.data not in self.allowed:
+            raise ValidationError(self.gettext('Not a valid choice.'))
+
+
+class RegistrySelectMultipleField(SelectMultipleField):
+    """SelectMultipleField validated by membership in ``allowed``."""
+
+    def __init__(self, label=None, validators=None, allowed=(), choices=None, **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.allowed = allowed
+        self.choices = choices
+
+    def pre_validate(self, form):
+        invalid = [value for value in self.data or () if value not in self.allowed]
+        if invalid:
+            raise ValidationError(self.gettext('Not a valid choice: ') + ', '.join(invalid))
+
+
+# ----------------------------------------------------------------------------#
+# Forms.
+# ----------------------------------------------------------------------------#
 
 class ShowForm(FlaskForm):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = RegistrySelectField(
+        'artist_id', validators=[DataRequired()],
+        coerce=int, allowed=artist_names
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = RegistrySelectField(
+        'venue_id', validators=[DataRequired()],
+        coerce=int, allowed=venue_names
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default=datetime.today()
+        default=datetime.today
     )
 
 
@@ -25,61 +90,9 @@ class VenueForm(FlaskForm):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = RegistrySelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        choices=STATE_CHOICES, allowed=STATE_SET
     )
     address = StringField(
         'address', validators=[DataRequired()]
@@ -90,30 +103,9 @@ class VenueForm(FlaskForm):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
-        # TODO implement enum restriction
+    genres = RegistrySelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=GENRE_CHOICES, allowed=GENRE_SET
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -128,6 +120,9 @@ class VenueForm(FlaskForm):
         'seeking_description'
     )
 
+    # Only used by the edit form: the row version the edit started from.
+    version = IntegerField('version', widget=HiddenInput())
+
 
 class ArtistForm(FlaskForm):
     name = StringField(
@@ -136,61 +131,9 @@ class ArtistForm(FlaskForm):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = RegistrySelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        choices=STATE_CHOICES, allowed=STATE_SET
     )
     phone = StringField(
         # TODO implement validation logic for state
@@ -199,29 +142,9 @@ class ArtistForm(FlaskForm):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
+    genres = RegistrySelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=GENRE_CHOICES, allowed=GENRE_SET
     )
     facebook_link = StringField(
         # TODO implement enum restriction
@@ -237,3 +160,5 @@ class ArtistForm(FlaskForm):
     seeking_description = StringField(
         'seeking_description'
     )
+
+    version = IntegerField('version', widget=HiddenInput())
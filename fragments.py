@@ -0,0 +1,95 @@
+"""``{% cache key, ttl %}...{% endcache %}`` fragment caching for templates.
+
+Rendered fragments are kept in an in-process LRU keyed by ``key``. Keys
+should name the entity and include the ``version`` of every row the
+fragment renders, so an edit in any worker makes the next render miss
+instead of serving a stale tile::
+
+    {% cache ('show-tile', show.id, show.venue_version, show.artist_version), 300 %}
+        ...
+    {% endcache %}
+
+Fragments built from many rows can use ``catalogue_version()`` instead, a
+counter bumped after every commit in this process that changes catalogue
+data. ``ttl`` (seconds, optional) then bounds staleness for writes made by
+other processes, which do not bump this process's counter.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+import events
+
+DEFAULT_TTL = 300
+MAX_ENTRIES = 10000
+
+
+class FragmentCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        self.version += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# One store per process, shared by the Flask and Quart template environments.
+fragment_cache = FragmentCache()
+events.on_change(fragment_cache.bump)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.globals['catalogue_version'] = lambda: fragment_cache.version
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(DEFAULT_TTL))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        method = '_render_async' if self.environment.is_async else '_render'
+        return nodes.CallBlock(self.call_method(method, args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        value = fragment_cache.get(key)
+        if value is None:
+            value = caller()
+            fragment_cache.set(key, value, ttl)
+        return value
+
+    async def _render_async(self, key, ttl, caller):
+        value = fragment_cache.get(key)
+        if value is None:
+            value = await caller()
+            fragment_cache.set(key, value, ttl)
+        return value
@@ -0,0 +1,26 @@
+"""Gunicorn settings: boot and warm the app once in the master, then fork.
+
+``warmed_app()`` compiles the templates and loads locale data before the
+fork, so workers start with that memory shared copy-on-write. Background
+threads are started per worker on its first request (see
+``app.start_services``), and the warm-up opens no database connections,
+so nothing in the master is unsafe to share.
+
+Workers are threaded, so each one serves several requests at once and the
+per-worker concurrency caps in ``CONCURRENCY_LIMITS`` can take effect.
+The server binds to localhost behind a reverse proxy, so one proxy hop is
+trusted for client addresses unless ``FYYUR_TRUSTED_PROXIES`` says
+otherwise.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'app:warmed_app()'
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Read by config.py when the app is loaded.
+os.environ.setdefault('FYYUR_TRUSTED_PROXIES', '1')
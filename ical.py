@@ -0,0 +1,58 @@
+"""iCalendar (RFC 5545) feeds of shows, for calendar app subscriptions."""
+from datetime import datetime, timedelta, timezone
+
+PRODID = '-//Fyyur//Shows//EN'
+# Shows have no end time; calendars get this as each event's length.
+SHOW_DURATION = 'PT2H'
+# How far back a feed reaches, so past events stay visible for a while.
+FEED_HISTORY = timedelta(days=90)
+
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split ``line`` into chunks of at most 75 octets, as RFC 5545 requires."""
+    chunks = []
+    chunk = ''
+    size = 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        # Continuation lines start with a space, which counts toward the limit.
+        if size + width > (75 if not chunks else 74):
+            chunks.append(chunk)
+            chunk, size = '', 0
+        chunk += char
+        size += width
+    chunks.append(chunk)
+    return '\r\n '.join(chunks)
+
+
+def feed(name, shows, base_url):
+    """The text of a calendar named ``name`` with one event per show."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape(name)}',
+    ]
+    for show in shows:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:show-{show.id}@fyyur',
+            f'DTSTAMP:{stamp}',
+            # Start times are stored as local wall-clock times, so they are
+            # sent as floating times rather than converted to UTC.
+            f"DTSTART:{show.start_time.strftime('%Y%m%dT%H%M%S')}",
+            f'DURATION:{SHOW_DURATION}',
+            f'SUMMARY:{escape(f"{show.artist_name} at {show.venue_name}")}',
+            f'LOCATION:{escape(show.venue_name)}',
+            f'URL:{base_url}venues/{show.venue_id}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ''.join(fold(line) + '\r\n' for line in lines)
@@ -0,0 +1,226 @@
+"""Write-behind queue: a SQLite job table plus a pool of worker threads.
+
+With ``WRITE_BEHIND`` enabled, form submissions are validated in the
+request, recorded here with ``JobQueue.enqueue`` and answered with a
+redirect straight away. ``WritePool`` threads claim queued jobs in batches
+and apply each batch to the main database in a single transaction.
+
+A job that fails because the database is unreachable (connection errors,
+timeouts) is queued again with exponential backoff, up to
+``max_attempts`` times; any other error fails it for good.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Errors that say nothing about the job itself, only that the database
+# could not be reached or did not answer in time.
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+'''
+
+
+class JobQueue:
+    """Durable FIFO of write jobs, safe to share between worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            # Queue files created before retries existed.
+            if 'attempts' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+            if 'run_after' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN run_after REAL NOT NULL DEFAULT 0')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # isolation_level=None leaves transaction control to the statements below.
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, kind, *args):
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'INSERT INTO jobs (kind, args, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                (kind, json.dumps(args), now, now))
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def claim(self, limit):
+        """Mark up to ``limit`` due queued jobs as running and return them.
+
+        Jobs come back as ``(id, kind, args, attempts)``.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                'SELECT id, kind, args, attempts FROM jobs WHERE status = ? AND run_after <= ? '
+                'ORDER BY id LIMIT ?',
+                (QUEUED, time.time(), limit)).fetchall()
+            conn.executemany(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?',
+                [(RUNNING, time.time(), row[0]) for row in rows])
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return [(job_id, kind, json.loads(args), attempts)
+                for job_id, kind, args, attempts in rows]
+
+    def finish(self, job_ids, status, error=None):
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                [(status, error, time.time(), job_id) for job_id in job_ids])
+        finally:
+            conn.close()
+
+    def retry(self, job_ids, error, delay):
+        """Queue jobs again to run no sooner than ``delay`` seconds from now."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'UPDATE jobs SET status = ?, error = ?, attempts = attempts + 1, run_after = ?, '
+                'updated_at = ? WHERE id = ?',
+                [(QUEUED, error, now + delay, now, job_id) for job_id in job_ids])
+        finally:
+            conn.close()
+
+    def requeue_stale(self, stale_after):
+        """Put jobs left running by a crashed worker back in the queue."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?',
+                (QUEUED, now, RUNNING, now - stale_after))
+        finally:
+            conn.close()
+
+    def status(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT id, kind, status, error, attempts, created_at, updated_at FROM jobs '
+                'WHERE id = ?',
+                (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return dict(zip(('id', 'kind', 'status', 'error', 'attempts', 'created_at', 'updated_at'),
+                        row))
+
+
+class WritePool:
+    """Worker threads that drain a ``JobQueue`` into the app database."""
+
+    def __init__(self, app, db, queue, handlers, workers=2, batch_size=50, poll_interval=0.2,
+                 stale_after=300, max_attempts=20, retry_delay=1.0, max_retry_delay=300):
+        self.app = app
+        self.db = db
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'write-behind-{number}', daemon=True)
+            thread.start()
+
+    def _run(self):
+        # Every worker checks for stale jobs now and then, so jobs left
+        # running by a crashed process are picked up without a restart.
+        requeued_at = None
+        while True:
+            try:
+                if requeued_at is None or time.monotonic() - requeued_at >= self.stale_after / 2:
+                    self.queue.requeue_stale(self.stale_after)
+                    requeued_at = time.monotonic()
+                batch = self.queue.claim(self.batch_size)
+                if not batch:
+                    time.sleep(self.poll_interval)
+                    continue
+                with self.app.app_context():
+                    self._apply_batch(batch)
+            except Exception:
+                # E.g. the queue file is locked; claimed jobs are requeued once stale.
+                logger.exception('write-behind worker error')
+                time.sleep(self.poll_interval)
+
+    def _apply_batch(self, batch):
+        session = self.db.session
+        try:
+            for _, kind, args, _ in batch:
+                self.handlers[kind](*args)
+            session.commit()
+        except TRANSIENT_ERRORS as e:
+            session.rollback()
+            self._retry(batch, e)
+            return
+        except Exception as e:
+            session.rollback()
+            if len(batch) > 1:
+                # Retry one job per transaction so a single bad job fails alone.
+                for job in batch:
+                    self._apply_batch([job])
+                return
+            logger.exception('write-behind job %s failed', batch[0][0])
+            self.queue.finish([batch[0][0]], FAILED, error=f'{type(e).__name__}: {e}')
+            return
+        self.queue.finish([job_id for job_id, _, _, _ in batch], DONE)
+
+    def _retry(self, batch, error):
+        message = f'{type(error).__name__}: {error}'
+        exhausted = [job[0] for job in batch if job[3] + 1 >= self.max_attempts]
+        if exhausted:
+            logger.error('write-behind jobs %s failed after %d attempts: %s',
+                         exhausted, self.max_attempts, message)
+            self.queue.finish(exhausted, FAILED, error=message)
+        retry = [job for job in batch if job[0] not in exhausted]
+        if retry:
+            attempts = max(job[3] for job in retry)
+            delay = min(self.retry_delay * 2 ** attempts, self.max_retry_delay)
+            logger.warning('write-behind jobs %s retry in %.1fs: %s',
+                           [job[0] for job in retry], delay, message)
+            self.queue.retry([job[0] for job in retry], message, delay)
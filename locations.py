@@ -0,0 +1,88 @@
+"""Normalized city/state locations for venues.
+
+Free-text city and state values are reduced to a ``(state, slug)`` key:
+the state trimmed and upper-cased, the city case-folded with runs of
+spaces and punctuation collapsed to single hyphens. "San Francisco",
+"san francisco " and "San  Francisco" therefore share one ``Location``
+row, and the slug doubles as the city part of the area page URL,
+``/venues/CA/san-francisco``.
+"""
+import re
+
+import click
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Location, Venue
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def normalize_state(state):
+    return (state or '').strip().upper()
+
+
+def normalize_city(city):
+    return ' '.join((city or '').split())
+
+
+def slugify(city):
+    return re.sub(r'[\W_]+', '-', city.casefold()).strip('-') or '-'
+
+
+def locate(city, state):
+    """ID of the location for ``city``/``state``, created if new; does not commit."""
+    city, state = normalize_city(city), normalize_state(state)
+    slug = slugify(city)
+    statement = select(Location.id).where(Location.state == state, Location.slug == slug)
+    location_id = db.session.execute(statement).scalar()
+    if location_id is None:
+        try:
+            with db.session.begin_nested():
+                location = Location(city=city, state=state, slug=slug)
+                db.session.add(location)
+            location_id = location.id
+        except IntegrityError:
+            # Another transaction created it first.
+            location_id = db.session.execute(statement).scalar_one()
+    return location_id
+
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE):
+    """Assign locations to venues that have none, committing once per batch.
+
+    Returns the number of venues updated. Safe to rerun; it only picks up
+    venues whose ``location_id`` is still NULL.
+    """
+    located = {}
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            select(Venue.id, Venue.city, Venue.state)
+            .where(Venue.location_id.is_(None))
+            .order_by(Venue.id)
+            .limit(batch_size)).all()
+        if not rows:
+            return updated
+        venue_ids = {}
+        for venue_id, city, state in rows:
+            key = (normalize_state(state), slugify(normalize_city(city)))
+            if key not in located:
+                located[key] = locate(city, state)
+            venue_ids.setdefault(located[key], []).append(venue_id)
+        for location_id, ids in venue_ids.items():
+            db.session.execute(update(Venue).where(Venue.id.in_(ids)).values(location_id=location_id))
+        db.session.commit()
+        updated += len(rows)
+
+
+def init_app(app):
+    @app.cli.group('locations')
+    def locations_cli():
+        """Venue city/state locations."""
+
+    @locations_cli.command('backfill')
+    @click.option('--batch-size', default=BACKFILL_BATCH_SIZE, show_default=True)
+    def backfill_command(batch_size):
+        """Assign a location to every venue that has none."""
+        click.echo(f'{backfill(batch_size)} venues located')
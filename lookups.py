@@ -0,0 +1,66 @@
+"""Cached ID -> name lookups backing the venue and artist pickers.
+
+Each lookup is built with one two-column query and then served from
+memory. It is dropped after any commit that changes catalogue data (see
+``events``) and after ``ttl`` seconds, which also covers writes made by
+other worker processes. Until then, an ID missing from the cache is
+checked against the table before it is rejected, so a row just created by
+another worker still validates.
+"""
+import threading
+import time
+
+from sqlalchemy import select
+
+import events
+from models import db, Venue, Artist
+
+
+class NameLookup:
+    """``{id: name}`` for one model, plus the matching form choices."""
+
+    def __init__(self, model, ttl=60):
+        self.model = model
+        self.ttl = ttl
+        self._names = None
+        self._choices = ()
+        self._expires = 0
+        self._lock = threading.Lock()
+        events.on_change(self.invalidate)
+
+    def invalidate(self):
+        self._expires = 0
+
+    def _load(self):
+        with self._lock:
+            if time.monotonic() < self._expires:
+                return
+            rows = db.session.execute(
+                select(self.model.id, self.model.name).order_by(self.model.name)).all()
+            self._names = dict(rows)
+            self._choices = tuple((id, f'{name} (#{id})') for id, name in rows)
+            self._expires = time.monotonic() + self.ttl
+
+    def names(self):
+        if time.monotonic() >= self._expires:
+            self._load()
+        return self._names
+
+    def choices(self):
+        if time.monotonic() >= self._expires:
+            self._load()
+        return self._choices
+
+    def __contains__(self, id):
+        if id in self.names():
+            return True
+        found = db.session.execute(select(self.model.id).where(self.model.id == id)).first()
+        if found is None:
+            return False
+        # Created since the last load; show it in the pickers too.
+        self.invalidate()
+        return True
+
+
+venue_names = NameLookup(Venue)
+artist_names = NameLookup(Artist)
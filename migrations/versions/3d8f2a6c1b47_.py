@@ -0,0 +1,38 @@
+"""venue locations
+
+Revision ID: 3d8f2a6c1b47
+Revises: 7c1e4b9d2a31
+Create Date: 2026-10-19 15:00:00.000000
+
+Existing venues keep location_id NULL until `flask locations backfill` runs.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8f2a6c1b47'
+down_revision = '7c1e4b9d2a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Location',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('slug', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('state', 'slug', name='uq_Location_state_slug')
+    )
+    op.add_column('Venue', sa.Column('location_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('Venue_location_id_fkey', 'Venue', 'Location', ['location_id'], ['id'])
+    op.create_index('ix_Venue_location_id_name', 'Venue', ['location_id', 'name'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_location_id_name', table_name='Venue')
+    op.drop_constraint('Venue_location_id_fkey', 'Venue', type_='foreignkey')
+    op.drop_column('Venue', 'location_id')
+    op.drop_table('Location')
@@ -0,0 +1,30 @@
+"""daily view counters
+
+Revision ID: 4c7f1e8a2d95
+Revises: e2a9c4b81f06
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7f1e8a2d95'
+down_revision = 'e2a9c4b81f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ViewCount',
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('views', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'day', 'item_id')
+    )
+
+
+def downgrade():
+    op.drop_table('ViewCount')
@@ -0,0 +1,24 @@
+"""show start time index
+
+Revision ID: 9b4e7d3f5a12
+Revises: 3d8f2a6c1b47
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e7d3f5a12'
+down_revision = '3d8f2a6c1b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_Show_start_time'), 'Show', ['start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Show_start_time'), table_name='Show')
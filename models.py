@@ -1,16 +1,3 @@
-from datetime import datetime
-from flask import (
-    Flask,
-    render_template,
-    request,
-    Response,
-    flash,
-    redirect,
-    url_for,
-    config
-)
-from flask_migrate import Migrate
-from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -20,8 +7,20 @@ db = SQLAlchemy()
 # Models.
 # ----------------------------------------------------------------------------#
 
+class Location(db.Model):
+    """One row per distinct city/state, keyed by a normalized city slug."""
+    __tablename__ = 'Location'
+    __table_args__ = (db.UniqueConstraint('state', 'slug', name='uq_Location_state_slug'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    slug = db.Column(db.String(120), nullable=False)
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (db.Index('ix_Venue_location_id_name', 'location_id', 'name'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -35,7 +34,11 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref=db.backref('Venue'), lazy="joined")
+    # Bumped by every edit; edits carry the version they started from.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    location_id = db.Column(db.Integer, db.ForeignKey('Location.id'))
+    shows = db.relationship('Show', backref=db.backref('Venue'), lazy="joined",
+                            cascade='all, delete-orphan', passive_deletes=True)
 
 
 class Artist(db.Model):
@@ -52,12 +55,31 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref=db.backref('Artist'), lazy="joined")
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    shows = db.relationship('Show', backref=db.backref('Artist'), lazy="joined",
+                            cascade='all, delete-orphan', passive_deletes=True)
 
 
 class Show(db.Model):
     __tablename__ = 'Show'
     id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime, nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+                         nullable=False, index=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+                          nullable=False, index=True)
+
+
+class ViewCount(db.Model):
+    """Page views of one venue or artist in one day, added up in batches.
+
+    No foreign key: counters are written often and outside catalogue
+    transactions, and rows of deleted items simply drop out of the
+    popularity query, which joins the catalogue tables.
+    """
+    __tablename__ = 'ViewCount'
+
+    kind = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    views = db.Column(db.Integer, nullable=False)
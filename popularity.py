@@ -0,0 +1,133 @@
+"""Most viewed venues and artists.
+
+Detail page views are counted in process memory, and a background thread
+adds them to the ``ViewCount`` table every ``VIEW_FLUSH_INTERVAL``
+seconds with one batched upsert. Counters are per item and day, so a
+popular page costs its worker one row update per flush rather than one
+per hit, and recording a view never touches the database.
+
+The same thread recomputes the most viewed items of the last
+``POPULAR_WINDOW_DAYS`` days; listing pages only read that in-memory list.
+"""
+import atexit
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+
+from sqlalchemy import delete, desc, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Venue, Artist, ViewCount
+
+MODELS = {'venue': Venue, 'artist': Artist}
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+# Rows per INSERT statement, well below PostgreSQL's bind parameter limit.
+UPSERT_BATCH_SIZE = 1000
+
+Popular = namedtuple('Popular', ('id', 'name', 'views'))
+
+
+def popular_select(kind, since, limit):
+    model = MODELS[kind]
+    views = func.sum(ViewCount.views).label('views')
+    return (select(model.id, model.name, views)
+            .join(ViewCount, ViewCount.item_id == model.id)
+            .where(ViewCount.kind == kind, ViewCount.day >= since)
+            .group_by(model.id, model.name)
+            .order_by(desc(views), model.id)
+            .limit(limit))
+
+
+def add_counts(connection, counts):
+    """Add ``{(kind, day, item_id): views}`` to the stored counters."""
+    insert = UPSERTS[connection.dialect.name]
+    # Primary key order, so concurrent flushes from several workers lock
+    # rows in the same order and cannot deadlock.
+    rows = [{'kind': kind, 'day': day, 'item_id': item_id, 'views': views}
+            for (kind, day, item_id), views in sorted(counts.items())]
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        statement = insert(ViewCount).values(rows[start:start + UPSERT_BATCH_SIZE])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['kind', 'day', 'item_id'],
+            set_={'views': ViewCount.views + statement.excluded.views}))
+
+
+class ViewCounter:
+    """Per-process view counts, flushed and ranked from a daemon thread."""
+
+    def __init__(self, app, flush_interval=10, refresh_interval=60, window=7, limit=10,
+                 retention=35):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self.window = window
+        self.limit = limit
+        self.retention = retention
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._popular = {}
+        self._pruned = None
+        self._thread = None
+
+    def record(self, kind, item_id):
+        key = (kind, date.today(), item_id)
+        with self._lock:
+            self._counts[key] += 1
+
+    def popular(self, kind):
+        """The most viewed items of ``kind``; empty until the first refresh."""
+        return self._popular.get(kind, [])
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+            # Views counted since the last flush would be lost on shutdown.
+            atexit.register(self.flush)
+
+    def flush(self):
+        """Write the pending counts; they are kept for the next try on failure."""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        try:
+            # A plain connection rather than the session: counter writes must
+            # not trigger the catalogue change listeners (see events.py).
+            with self.app.app_context(), db.engine.begin() as connection:
+                add_counts(connection, counts)
+        except Exception:
+            with self._lock:
+                self._counts.update(counts)
+            raise
+        return sum(counts.values())
+
+    def refresh(self):
+        today = date.today()
+        since = today - timedelta(days=self.window - 1)
+        with self.app.app_context(), db.engine.begin() as connection:
+            self._popular = {
+                kind: [Popular._make(row)
+                       for row in connection.execute(popular_select(kind, since, self.limit))]
+                for kind in MODELS
+            }
+            if self._pruned != today:
+                connection.execute(delete(ViewCount).where(
+                    ViewCount.day < today - timedelta(days=self.retention)))
+                self._pruned = today
+
+    def _run(self):
+        refreshed = None
+        while True:
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('view counter flush failed')
+            if refreshed is None or time.monotonic() - refreshed >= self.refresh_interval:
+                try:
+                    self.refresh()
+                    refreshed = time.monotonic()
+                except Exception:
+                    self.app.logger.exception('popularity refresh failed')
+            time.sleep(self.flush_interval)
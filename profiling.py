@@ -0,0 +1,244 @@
+"""On-demand profiling of live requests.
+
+With ``PROFILE_DIR`` set, a WSGI middleware profiles a request when it
+carries a valid ``X-Fyyur-Profile`` header, and additionally a random
+``PROFILE_SAMPLE_RATE`` fraction of all requests. The header value is a
+token for the request path signed with ``PROFILE_SECRET``; print one with
+
+    flask profile token /venues --ttl 3600
+
+``PROFILE_MODE`` picks the profiler:
+
+* ``sample`` (default): a thread records the request's stack every
+  ``PROFILE_INTERVAL`` seconds; written as ``.folded`` stacks for
+  flamegraph.pl, speedscope or inferno.
+* ``cprofile``: deterministic cProfile, written as a ``.prof`` stats file
+  for snakeviz or flameprof. Much higher overhead.
+
+Every capture is listed in ``index.jsonl`` in the same directory; the
+``/_profiles`` page in app.py shows the slowest captures per route.
+"""
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import count
+
+import click
+
+HEADER = 'HTTP_X_FYYUR_PROFILE'
+INDEX = 'index.jsonl'
+SLOWEST_PER_ROUTE = 10
+_sequence = count()
+
+
+# ----------------------------------------------------------------------------#
+# Tokens.
+# ----------------------------------------------------------------------------#
+
+def _signature(secret, path, expires):
+    return hmac.new(secret.encode('utf-8'), f'{expires}:{path}'.encode('utf-8'),
+                    hashlib.sha256).hexdigest()
+
+
+def make_token(secret, path, ttl=3600):
+    expires = int(time.time() + ttl)
+    return f'{expires}.{_signature(secret, path, expires)}'
+
+
+def verify_token(secret, path, token):
+    if not secret or not token or '.' not in token:
+        return False
+    expires, signature = token.split('.', 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(secret, path, int(expires)))
+
+
+def route(method, path):
+    return f"{method} {re.sub(r'/[0-9]+(?=/|$)', '/<id>', path)}"
+
+
+# ----------------------------------------------------------------------------#
+# Profilers.
+# ----------------------------------------------------------------------------#
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a background thread."""
+
+    extension = '.folded'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            # A sample taken while stopping only shows this profiler.
+            if stack and not self._stop.is_set():
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f'{stack} {samples}\n')
+
+
+class FunctionProfiler:
+    """cProfile for the current thread."""
+
+    extension = '.prof'
+
+    def __init__(self, interval=None):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def write(self, path):
+        self._profile.dump_stats(path)
+
+
+PROFILERS = {'sample': StackSampler, 'cprofile': FunctionProfiler}
+
+
+# ----------------------------------------------------------------------------#
+# Middleware.
+# ----------------------------------------------------------------------------#
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, directory, secret=None, sample_rate=0.0, mode='sample',
+                 interval=0.005):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.profiler = PROFILERS[mode]
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    def _wanted(self, environ):
+        token = environ.get(HEADER)
+        if token:
+            return verify_token(self.secret, environ.get('PATH_INFO', '/'), token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ):
+            return self.wsgi_app(environ, start_response)
+        status = []
+
+        def capture_start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+            return start_response(status_line, headers, exc_info)
+
+        profiler = self.profiler(self.interval)
+        started = time.time()
+        profiler.start()
+        try:
+            # Consume the body inside the profile so lazy rendering counts too.
+            body = self.wsgi_app(environ, capture_start_response)
+            try:
+                chunks = list(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            profiler.stop()
+            elapsed = time.time() - started
+            self._save(profiler, environ, status[0] if status else 500, started, elapsed)
+        return chunks
+
+    def _save(self, profiler, environ, status, started, elapsed):
+        method, path = environ['REQUEST_METHOD'], environ.get('PATH_INFO', '/')
+        filename = f'{int(started * 1000)}-{os.getpid()}-{next(_sequence)}{profiler.extension}'
+        profiler.write(os.path.join(self.directory, filename))
+        record = {
+            't': round(started, 3),
+            'route': route(method, path),
+            'method': method,
+            'path': path,
+            'query': environ.get('QUERY_STRING', ''),
+            'status': status,
+            'ms': round(elapsed * 1000, 1),
+            'file': filename,
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        fd = os.open(os.path.join(self.directory, INDEX), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+# ----------------------------------------------------------------------------#
+# Index page.
+# ----------------------------------------------------------------------------#
+
+def slowest_by_route(directory, limit=SLOWEST_PER_ROUTE):
+    """``[(route, [records, slowest first])]``, slowest routes first."""
+    routes = {}
+    try:
+        with open(os.path.join(directory, INDEX)) as f:
+            for line in f:
+                record = json.loads(line)
+                record['started'] = datetime.fromtimestamp(record['t'])
+                routes.setdefault(record['route'], []).append(record)
+    except FileNotFoundError:
+        return []
+    result = [(name, sorted(records, key=lambda record: -record['ms'])[:limit])
+              for name, records in routes.items()]
+    return sorted(result, key=lambda item: -item[1][0]['ms'])
+
+
+def init_app(app):
+    directory = app.config['PROFILE_DIR']
+    secret = app.config['PROFILE_SECRET']
+
+    @app.cli.group('profile')
+    def profile_cli():
+        """Request profiling."""
+
+    @profile_cli.command('token')
+    @click.argument('path')
+    @click.option('--ttl', default=3600, show_default=True, help='Seconds the token stays valid.')
+    def token_command(path, ttl):
+        """Print an X-Fyyur-Profile header value for PATH."""
+        if not secret:
+            raise click.ClickException('PROFILE_SECRET is not set')
+        click.echo(make_token(secret, path, ttl))
+
+    if not directory:
+        return
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app, directory, secret,
+        sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+        mode=app.config['PROFILE_MODE'],
+        interval=app.config['PROFILE_INTERVAL'])
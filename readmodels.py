@@ -0,0 +1,325 @@
+"""Read-only views of Venue, Artist and Show rows for templates.
+
+The statements below select plain columns instead of ORM entities, so rows
+skip the identity map and change tracking and never drag in the joined
+``shows`` relationship. Each row is wrapped in a namedtuple, which keeps
+attribute access in templates (``venue.name``) without a per-row
+``__dict__``. The statement builders are shared with the async views in
+``async_app``.
+"""
+import calendar
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import distinct, func, select
+
+from locations import normalize_city, normalize_state, slugify
+from models import db, Location, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Views.
+# ----------------------------------------------------------------------------#
+
+VENUE_FIELDS = (
+    'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+    'facebook_link', 'seeking_talent', 'seeking_description', 'image_link', 'version',
+)
+ARTIST_FIELDS = (
+    'id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+    'facebook_link', 'seeking_venue', 'seeking_description', 'image_link', 'version',
+)
+SHOW_LISTS = (
+    'past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count',
+)
+
+VenueView = namedtuple('VenueView', VENUE_FIELDS)
+ArtistView = namedtuple('ArtistView', ARTIST_FIELDS)
+VenueDetail = namedtuple('VenueDetail', VENUE_FIELDS + SHOW_LISTS)
+ArtistDetail = namedtuple('ArtistDetail', ARTIST_FIELDS + SHOW_LISTS)
+
+VenueSummary = namedtuple('VenueSummary', ('id', 'name', 'upcoming_shows'))
+Listing = namedtuple('Listing', ('id', 'name'))
+Area = namedtuple('Area', ('city', 'state', 'slug', 'venue_count', 'venues'))
+Page = namedtuple('Page', ('number', 'pages'))
+# Show list filters: start (inclusive) and end (exclusive) datetimes, a
+# location city slug and state, and an artist genre. None means any.
+ShowFilters = namedtuple('ShowFilters', ('start', 'end', 'city', 'state', 'genre'),
+                         defaults=(None,) * 5)
+CalendarDay = namedtuple('CalendarDay', ('day', 'shows', 'in_month'))
+CalendarMonth = namedtuple('CalendarMonth', ('month', 'weeks', 'previous', 'next'))
+ShowView = namedtuple('ShowView', (
+    'id', 'start_time',
+    'venue_id', 'venue_name', 'venue_image_link', 'venue_version',
+    'artist_id', 'artist_name', 'artist_image_link', 'artist_version',
+))
+
+VENUE_COLUMNS = tuple(getattr(Venue, field) for field in VENUE_FIELDS)
+ARTIST_COLUMNS = tuple(getattr(Artist, field) for field in ARTIST_FIELDS)
+SHOW_COLUMNS = (
+    Show.id, Show.start_time,
+    Show.venue_id, Venue.name, Venue.image_link, Venue.version,
+    Show.artist_id, Artist.name, Artist.image_link, Artist.version,
+)
+
+
+AREAS_PER_PAGE = 20
+AREA_PREVIEW = 10
+VENUES_PER_PAGE = 50
+# Calendar weeks start on Sunday.
+CALENDAR = calendar.Calendar(firstweekday=calendar.SUNDAY)
+
+# ----------------------------------------------------------------------------#
+# Statements.
+# ----------------------------------------------------------------------------#
+
+def shows_select():
+    return (select(*SHOW_COLUMNS)
+            .join(Venue, Venue.id == Show.venue_id)
+            .join(Artist, Artist.id == Show.artist_id)
+            .order_by(Show.start_time))
+
+
+def filter_shows(statement, filters):
+    """Apply ``filters`` to a statement that already joins Venue and Artist."""
+    if filters.start:
+        statement = statement.where(Show.start_time >= filters.start)
+    if filters.end:
+        statement = statement.where(Show.start_time < filters.end)
+    if filters.city or filters.state:
+        statement = statement.join(Location, Location.id == Venue.location_id)
+        if filters.city:
+            statement = statement.where(Location.slug == filters.city)
+        if filters.state:
+            statement = statement.where(Location.state == filters.state)
+    if filters.genre:
+        statement = statement.where(Artist.genres.any(filters.genre))
+    return statement
+
+
+def day_counts_select(filters):
+    """Shows per day for ``filters``, as one aggregate over the start_time range."""
+    day = func.date(Show.start_time).label('day')
+    statement = (select(day, func.count(Show.id))
+                 .select_from(Show)
+                 .join(Venue, Venue.id == Show.venue_id)
+                 .join(Artist, Artist.id == Show.artist_id)
+                 .group_by(day))
+    return filter_shows(statement, filters)
+
+
+def venue_select(venue_id):
+    return select(*VENUE_COLUMNS).where(Venue.id == venue_id)
+
+
+def artist_select(artist_id):
+    return select(*ARTIST_COLUMNS).where(Artist.id == artist_id)
+
+
+def with_upcoming(venues, now):
+    """Rows of subquery ``venues`` plus each venue's upcoming show count."""
+    upcoming = func.count(Show.id).filter(Show.start_time > now).label('upcoming_shows')
+    return (select(*venues.c, upcoming)
+            .outerjoin(Show, Show.venue_id == venues.c.id)
+            .group_by(*venues.c))
+
+
+def area_count_select():
+    return select(func.count(distinct(Venue.location_id)))
+
+
+def area_index_select(offset, limit):
+    return (select(Location.city, Location.state, Location.slug,
+                   func.count(Venue.id).label('venue_count'), Location.id)
+            .join(Venue, Venue.location_id == Location.id)
+            .group_by(Location.id)
+            .order_by(Location.state, Location.slug)
+            .offset(offset).limit(limit))
+
+
+def area_preview_select(location_ids, now, preview):
+    """The first ``preview`` venues by name of each location."""
+    ranked = (select(Venue.location_id, Venue.id, Venue.name,
+                     func.row_number().over(partition_by=Venue.location_id,
+                                            order_by=Venue.name).label('rank'))
+              .where(Venue.location_id.in_(location_ids))
+              .subquery())
+    top = select(ranked).where(ranked.c.rank <= preview).subquery()
+    return with_upcoming(top, now).order_by(top.c.location_id, top.c.rank)
+
+
+def area_select(state, slug):
+    venue_count = select(func.count(Venue.id)).where(Venue.location_id == Location.id)
+    return (select(Location.city, Location.state, Location.slug,
+                   venue_count.scalar_subquery().label('venue_count'), Location.id)
+            .where(Location.state == state, Location.slug == slug))
+
+
+def location_venues_select(location_id, now, offset, limit):
+    # Page through the (location_id, name) index before counting shows.
+    venues = (select(Venue.id, Venue.name)
+              .where(Venue.location_id == location_id)
+              .order_by(Venue.name)
+              .offset(offset).limit(limit)
+              .subquery())
+    return with_upcoming(venues, now).order_by(venues.c.name)
+
+
+def artist_list_select():
+    return select(Artist.id, Artist.name).order_by(Artist.name)
+
+
+def search_select(model, term):
+    return (select(model.id, model.name)
+            .where(model.name.ilike(f'%{term}%'))
+            .order_by(model.name))
+
+
+def split_shows(rows, now):
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        show = ShowView._make(row)
+        if show.start_time <= now:
+            past_shows.append(show)
+        else:
+            upcoming_shows.append(show)
+    return past_shows, upcoming_shows, len(past_shows), len(upcoming_shows)
+
+
+def parse_show_filters(args):
+    """``ShowFilters`` from ``from``/``to`` (YYYY-MM-DD, inclusive), ``city``,
+    ``state`` and ``genre`` query arguments; raises ValueError on bad dates."""
+    start = args.get('from')
+    end = args.get('to')
+    city = normalize_city(args.get('city'))
+    return ShowFilters(
+        start=datetime.fromisoformat(start) if start else None,
+        end=datetime.fromisoformat(end) + timedelta(days=1) if end else None,
+        city=slugify(city) if city else None,
+        state=normalize_state(args.get('state')) or None,
+        genre=args.get('genre') or None,
+    )
+
+
+def build_day_counts(rows):
+    # date() comes back as a date from PostgreSQL and as text from SQLite.
+    return {day if isinstance(day, date) else date.fromisoformat(day): count
+            for day, count in rows}
+
+
+def build_month(month, weeks, counts):
+    return CalendarMonth(
+        month=month,
+        weeks=[[CalendarDay(day, counts.get(day, 0), day.month == month.month) for day in week]
+               for week in weeks],
+        previous=(month - timedelta(days=1)).replace(day=1),
+        next=(month + timedelta(days=31)).replace(day=1),
+    )
+
+
+def page_count(total, per_page):
+    return max(1, -(-total // per_page))
+
+
+def build_area_index(locations, venues):
+    previews = {}
+    for row in venues:
+        previews.setdefault(row.location_id, []).append(
+            VenueSummary(row.id, row.name, row.upcoming_shows))
+    return [Area(city, state, slug, venue_count, previews.get(id, []))
+            for city, state, slug, venue_count, id in locations]
+
+
+def build_area(location, venues):
+    city, state, slug, venue_count, id = location
+    return Area(city, state, slug, venue_count, [VenueSummary._make(row) for row in venues])
+
+
+# ----------------------------------------------------------------------------#
+# Queries.
+# ----------------------------------------------------------------------------#
+
+def get_venue(venue_id):
+    row = db.session.execute(venue_select(venue_id)).first()
+    return VenueView._make(row) if row else None
+
+
+def get_artist(artist_id):
+    row = db.session.execute(artist_select(artist_id)).first()
+    return ArtistView._make(row) if row else None
+
+
+def venue_detail(venue_id):
+    venue = get_venue(venue_id)
+    if venue is None:
+        return None
+    shows = db.session.execute(shows_select().where(Show.venue_id == venue_id))
+    return VenueDetail(*venue, *split_shows(shows, datetime.now()))
+
+
+def artist_detail(artist_id):
+    artist = get_artist(artist_id)
+    if artist is None:
+        return None
+    shows = db.session.execute(shows_select().where(Show.artist_id == artist_id))
+    return ArtistDetail(*artist, *split_shows(shows, datetime.now()))
+
+
+def area_index(page=1, per_page=AREAS_PER_PAGE, preview=AREA_PREVIEW):
+    """One page of locations, each with its first ``preview`` venues."""
+    total = db.session.execute(area_count_select()).scalar()
+    locations = db.session.execute(area_index_select((page - 1) * per_page, per_page)).all()
+    venues = []
+    if locations:
+        venues = db.session.execute(
+            area_preview_select([row.id for row in locations], datetime.now(), preview))
+    return build_area_index(locations, venues), Page(page, page_count(total, per_page))
+
+
+def area_venues(state, slug, page=1, per_page=VENUES_PER_PAGE):
+    """One location with one page of its venues, or None if it is unknown."""
+    location = db.session.execute(area_select(state, slug)).first()
+    if location is None:
+        return None
+    venues = db.session.execute(
+        location_venues_select(location.id, datetime.now(), (page - 1) * per_page, per_page))
+    return build_area(location, venues), Page(page, page_count(location.venue_count, per_page))
+
+
+def artist_list():
+    return [Listing._make(row) for row in db.session.execute(artist_list_select())]
+
+
+def show_list(filters=None):
+    statement = shows_select()
+    if filters is not None:
+        statement = filter_shows(statement, filters)
+    return [ShowView._make(row) for row in db.session.execute(statement)]
+
+
+def day_counts(filters):
+    """``{date: number of shows}`` for the days in the ``filters`` range."""
+    return build_day_counts(db.session.execute(day_counts_select(filters)))
+
+
+def month_calendar(month, filters=ShowFilters()):
+    """The weeks of ``month`` with the number of shows on each day."""
+    weeks = CALENDAR.monthdatescalendar(month.year, month.month)
+    filters = filters._replace(
+        start=datetime.combine(weeks[0][0], datetime.min.time()),
+        end=datetime.combine(weeks[-1][-1] + timedelta(days=1), datetime.min.time()))
+    return build_month(month, weeks, day_counts(filters))
+
+
+def feed_shows(condition, since):
+    """Shows matching ``condition`` starting at or after ``since``, for feeds."""
+    statement = shows_select().where(condition, Show.start_time >= since)
+    return [ShowView._make(row) for row in db.session.execute(statement)]
+
+
+def search_venues(term):
+    return [Listing._make(row) for row in db.session.execute(search_select(Venue, term))]
+
+
+def search_artists(term):
+    return [Listing._make(row) for row in db.session.execute(search_select(Artist, term))]
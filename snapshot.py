@@ -0,0 +1,345 @@
+"""Catalogue snapshot shared by all worker processes through a memory-mapped file.
+
+The venue and artist catalogue (IDs, names, city/state codes, genre
+bitmasks and upcoming show counts, with venues grouped by location) is written to one compact file of
+fixed-width arrays plus a string table. Every worker maps that file and
+reads the arrays in place, so the catalogue is held once in the page
+cache however many workers run, and a restarted worker is warm as soon as
+it maps the file.
+
+One process at a time, elected with an exclusive ``flock``, rebuilds the
+file: on a timer, and shortly after any worker commits a catalogue change
+(each commit touches a ``.dirty`` marker next to the snapshot, see
+``events``). A new snapshot is written to a temporary file and renamed
+over the old one; readers notice the new inode and remap, while requests
+already holding the old mapping finish with it.
+
+File layout: an 8-byte magic, a 4-byte table of contents length, the JSON
+table of contents (section name -> ``[offset, typecode, size]``) and the
+sections, each 8-byte aligned.
+"""
+import array
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask import has_app_context
+from sqlalchemy import func, literal, select
+
+import events
+from forms import GENRES
+from models import db, Location, Venue, Artist, Show
+from readmodels import (
+    AREA_PREVIEW, AREAS_PER_PAGE, VENUES_PER_PAGE, Area, Listing, Page, VenueSummary, page_count,
+)
+
+MAGIC = b'FYYURCS1'
+HEADER = struct.Struct('<8sI')
+GENRE_BITS = {genre: 1 << bit for bit, genre in enumerate(GENRES)}
+
+
+def genre_mask(genres):
+    mask = 0
+    for genre in genres or ():
+        mask |= GENRE_BITS.get(genre, 0)
+    return mask
+
+
+def mask_genres(mask):
+    return [genre for genre, bit in GENRE_BITS.items() if mask & bit]
+
+
+# ----------------------------------------------------------------------------#
+# Build.
+# ----------------------------------------------------------------------------#
+
+def venue_catalogue_select(now):
+    # Venues are grouped by their normalized location, in area index order;
+    # venues not yet assigned a location are left out.
+    upcoming = func.count(Show.id).filter(Show.start_time > now)
+    return (select(Venue.id, Venue.name, Location.city, Location.state, Location.slug,
+                   Venue.genres, upcoming)
+            .join(Location, Location.id == Venue.location_id)
+            .outerjoin(Show, Show.venue_id == Venue.id)
+            .group_by(Venue.id, Location.id)
+            .order_by(Location.state, Location.slug, Venue.name))
+
+
+def artist_catalogue_select(now):
+    upcoming = func.count(Show.id).filter(Show.start_time > now)
+    return (select(Artist.id, Artist.name, Artist.city, Artist.state, literal(''),
+                   Artist.genres, upcoming)
+            .outerjoin(Show, Show.artist_id == Artist.id)
+            .group_by(Artist.id)
+            .order_by(Artist.name))
+
+
+def build_sections(now=None):
+    """Query the catalogue and return the snapshot sections."""
+    now = now or datetime.now()
+    strings = []
+    string_ids = {}
+    areas = {}
+
+    def intern(value):
+        value = value or ''
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    sections = {}
+    statements = {
+        'venue': venue_catalogue_select(now),
+        'artist': artist_catalogue_select(now),
+    }
+    # Venue locations are numbered first, in order, so the venues of area i
+    # are venue_*[area_starts[i]:area_starts[i + 1]].
+    area_starts = array.array('I')
+    for kind, statement in statements.items():
+        columns = {name: array.array(typecode) for name, typecode in
+                   (('ids', 'i'), ('names', 'I'), ('areas', 'I'), ('genres', 'I'),
+                    ('upcoming', 'I'), ('search_starts', 'I'))}
+        search = bytearray()
+        for id, name, city, state, slug, genres, upcoming in db.session.execute(statement):
+            area = areas.setdefault((city or '', state or '', slug), len(areas))
+            if kind == 'venue' and area == len(area_starts):
+                area_starts.append(len(columns['ids']))
+            columns['ids'].append(id)
+            columns['names'].append(intern(name))
+            columns['areas'].append(area)
+            columns['genres'].append(genre_mask(genres))
+            columns['upcoming'].append(upcoming)
+            # Case-folded names, one per line, searched in place by autocomplete.
+            columns['search_starts'].append(len(search))
+            search += (name or '').casefold().replace('\n', ' ').encode('utf-8') + b'\n'
+        if kind == 'venue':
+            area_starts.append(len(columns['ids']))
+        for name, values in columns.items():
+            sections[f'{kind}_{name}'] = values
+        sections[f'{kind}_search'] = bytes(search)
+
+    sections['area_starts'] = area_starts
+    sections['area_cities'] = array.array('I', (intern(city) for city, state, slug in areas))
+    sections['area_states'] = array.array('I', (intern(state) for city, state, slug in areas))
+    sections['area_slugs'] = array.array('I', (intern(slug) for city, state, slug in areas))
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = array.array('I', [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    sections['string_offsets'] = offsets
+    sections['strings'] = b''.join(encoded)
+    return sections
+
+
+def write(path, sections, built_at):
+    toc = {'built_at': built_at.isoformat(), 'sections': {}}
+    chunks = []
+    offset = 0
+    for name, values in sections.items():
+        data = values.tobytes() if isinstance(values, array.array) else values
+        typecode = values.typecode if isinstance(values, array.array) else 'B'
+        toc['sections'][name] = [offset, typecode, len(data)]
+        padding = -len(data) % 8
+        chunks.append(data + b'\0' * padding)
+        offset += len(data) + padding
+    toc_data = json.dumps(toc).encode('utf-8')
+    toc_data += b' ' * (-(HEADER.size + len(toc_data)) % 8)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(toc_data)))
+        f.write(toc_data)
+        for chunk in chunks:
+            f.write(chunk)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+# ----------------------------------------------------------------------------#
+# Read.
+# ----------------------------------------------------------------------------#
+
+class Snapshot:
+    """A mapped snapshot file; sections are memoryviews over the mapping."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, toc_size = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalogue snapshot')
+        toc = json.loads(self._map[HEADER.size:HEADER.size + toc_size])
+        self.built_at = datetime.fromisoformat(toc['built_at'])
+        self._base = HEADER.size + toc_size
+        view = memoryview(self._map)
+        self._sections = {}
+        self._offsets = {}
+        for name, (offset, typecode, size) in toc['sections'].items():
+            start = self._base + offset
+            self._offsets[name] = (start, start + size)
+            self._sections[name] = view[start:start + size].cast(typecode)
+        # (state, slug) -> area number, built on first use of area_venues().
+        self._area_ids = None
+
+    def __getitem__(self, name):
+        return self._sections[name]
+
+    def string(self, index):
+        offsets = self['string_offsets']
+        return str(self['strings'][offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def area(self, index, start, stop):
+        """Area ``index`` with its venues ``start:stop`` (absolute positions)."""
+        starts = self['area_starts']
+        ids, names, upcoming = self['venue_ids'], self['venue_names'], self['venue_upcoming']
+        return Area(self.string(self['area_cities'][index]),
+                    self.string(self['area_states'][index]),
+                    self.string(self['area_slugs'][index]),
+                    starts[index + 1] - starts[index],
+                    [VenueSummary(ids[i], self.string(names[i]), upcoming[i])
+                     for i in range(start, stop)])
+
+    def area_index(self, page=1, per_page=AREAS_PER_PAGE, preview=AREA_PREVIEW):
+        """Same shape as ``readmodels.area_index()``."""
+        starts = self['area_starts']
+        total = len(starts) - 1
+        first = (page - 1) * per_page
+        areas = [self.area(index, starts[index], min(starts[index + 1], starts[index] + preview))
+                 for index in range(first, min(first + per_page, total))]
+        return areas, Page(page, page_count(total, per_page))
+
+    def area_venues(self, state, slug, page=1, per_page=VENUES_PER_PAGE):
+        """Same shape as ``readmodels.area_venues()``."""
+        if self._area_ids is None:
+            states, slugs = self['area_states'], self['area_slugs']
+            self._area_ids = {(self.string(states[index]), self.string(slugs[index])): index
+                              for index in range(len(self['area_starts']) - 1)}
+        index = self._area_ids.get((state, slug))
+        if index is None:
+            return None
+        starts = self['area_starts']
+        first = starts[index] + (page - 1) * per_page
+        area = self.area(index, first, min(first + per_page, starts[index + 1]))
+        return area, Page(page, page_count(area.venue_count, per_page))
+
+    def artist_list(self):
+        """Same shape as ``readmodels.artist_list()``."""
+        return [Listing(id, self.string(name))
+                for id, name in zip(self['artist_ids'], self['artist_names'])]
+
+    def autocomplete(self, kind, term, limit=10):
+        """Entries whose name contains ``term``, case-insensitively, by name."""
+        needle = term.casefold().replace('\n', ' ').encode('utf-8')
+        starts = self[f'{kind}_search_starts']
+        start, end = self._offsets[f'{kind}_search']
+        matches = []
+        position = start
+        while True:
+            found = self._map.find(needle, position, end)
+            if found < 0:
+                break
+            index = bisect.bisect_right(starts, found - start) - 1
+            matches.append(self.entry(kind, index))
+            # Continue after this entry's line so each entry matches once.
+            position = start + (starts[index + 1] if index + 1 < len(starts) else end - start)
+        # Names are stored in id order, so every match is needed before the
+        # first ``limit`` by name are known.
+        return sorted(matches, key=lambda entry: entry['name'].casefold())[:limit]
+
+    def entry(self, kind, index):
+        area = self[f'{kind}_areas'][index]
+        return {
+            'id': self[f'{kind}_ids'][index],
+            'name': self.string(self[f'{kind}_names'][index]),
+            'city': self.string(self['area_cities'][area]),
+            'state': self.string(self['area_states'][area]),
+            'genres': mask_genres(self[f'{kind}_genres'][index]),
+            'upcoming_shows': self[f'{kind}_upcoming'][index],
+        }
+
+
+class CatalogueSnapshot:
+    """Maps the current snapshot file and, if elected, keeps it rebuilt."""
+
+    def __init__(self, app, path, interval=60, poll=0.5):
+        self.app = app
+        self.path = path
+        self.interval = interval
+        self.poll = poll
+        self.dirty_path = path + '.dirty'
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        events.on_change(self.mark_dirty)
+
+    def mark_dirty(self):
+        with open(self.dirty_path, 'a'):
+            os.utime(self.dirty_path)
+
+    def current(self):
+        """The latest snapshot, or None if there is none yet or it is stale.
+
+        A snapshot built before the last catalogue change is not used, so
+        callers query the database until the refresher has caught up.
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+            changed = os.stat(self.dirty_path).st_mtime
+        except FileNotFoundError as e:
+            if e.filename == self.path:
+                return None
+            changed = 0
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.inode != inode:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.inode != inode:
+                    snapshot = self._snapshot = Snapshot(self.path)
+        if snapshot.built_at.timestamp() < changed:
+            return None
+        return snapshot
+
+    def refresh(self):
+        now = datetime.now()
+        if has_app_context():
+            sections = build_sections(now)
+        else:
+            with self.app.app_context():
+                sections = build_sections(now)
+        write(self.path, sections, now)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='catalogue-snapshot', daemon=True)
+            self._thread.start()
+
+    def _dirty_since(self, built):
+        try:
+            return os.stat(self.dirty_path).st_mtime_ns > built
+        except FileNotFoundError:
+            return False
+
+    def _run(self):
+        with open(self.path + '.lock', 'a') as lock:
+            # Blocks until no other process is refreshing; if the refresher
+            # exits, its lock is released and a waiting worker takes over.
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            built = 0
+            next_build = 0
+            while True:
+                if self._dirty_since(built) or time.monotonic() >= next_build:
+                    built = time.time_ns()
+                    next_build = time.monotonic() + self.interval
+                    try:
+                        self.refresh()
+                    except Exception:
+                        self.app.logger.exception('catalogue snapshot refresh failed')
+                time.sleep(self.poll)
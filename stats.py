@@ -0,0 +1,175 @@
+"""Precomputed home page dashboard.
+
+The dashboard is built in one process and shared with the others through
+a pickle file. As with the catalogue snapshot (see ``snapshot``), one
+process at a time, elected with an exclusive ``flock``, rebuilds it: on a
+timer, and shortly after any commit that touches the catalogue
+``.dirty`` marker. Every process loads the file again when it is
+replaced. Requests only read the loaded dashboard, so the home page never
+runs aggregate queries, and each write costs one rebuild however many
+workers run.
+
+Genre counts use ``unnest`` on PostgreSQL. Other databases, which store
+genres as JSON, count them in Python instead.
+"""
+import fcntl
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+from sqlalchemy import func, select
+
+from models import db, Venue, Artist, Show
+import readmodels
+from readmodels import Listing, ShowView
+
+RECENT_LIMIT = 10
+UPCOMING_WINDOW = timedelta(hours=24)
+
+Dashboard = namedtuple('Dashboard', (
+    'recent_venues', 'recent_artists', 'shows', 'state_counts', 'genre_counts',
+    'refreshed_at',
+))
+StateCount = namedtuple('StateCount', ('state', 'venues', 'artists'))
+GenreCount = namedtuple('GenreCount', ('genre', 'venues', 'artists'))
+
+
+def build_dashboard(horizon):
+    """Query everything the home page shows, with shows up to ``horizon`` ahead."""
+    now = datetime.now()
+    session = db.session
+
+    def recent(model):
+        rows = session.execute(select(model.id, model.name)
+                               .order_by(model.id.desc()).limit(RECENT_LIMIT))
+        return [Listing._make(row) for row in rows]
+
+    def counts(column):
+        return dict(session.execute(select(column, func.count()).group_by(column)).all())
+
+    def genres(column):
+        if session.get_bind().dialect.name != 'postgresql':
+            counter = Counter()
+            for (names,) in session.execute(select(column)):
+                counter.update(names or ())
+            return counter
+        genre = select(func.unnest(column).label('genre')).subquery()
+        statement = select(genre.c.genre, func.count()).group_by(genre.c.genre)
+        return dict(session.execute(statement).all())
+
+    shows = session.execute(readmodels.shows_select()
+                            .where(Show.start_time > now, Show.start_time <= now + horizon))
+    venue_states, artist_states = counts(Venue.state), counts(Artist.state)
+    venue_genres, artist_genres = genres(Venue.genres), genres(Artist.genres)
+    return Dashboard(
+        recent_venues=recent(Venue),
+        recent_artists=recent(Artist),
+        shows=[ShowView._make(row) for row in shows],
+        state_counts=[StateCount(state, venue_states.get(state, 0), artist_states.get(state, 0))
+                      for state in sorted(set(venue_states) | set(artist_states), key=str)],
+        genre_counts=[GenreCount(genre, venue_genres.get(genre, 0), artist_genres.get(genre, 0))
+                      for genre in sorted(set(venue_genres) | set(artist_genres))],
+        refreshed_at=now,
+    )
+
+
+def publish(path, dashboard):
+    """Atomically replace the shared dashboard file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.dashboard-')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(dashboard, f, pickle.HIGHEST_PROTOCOL)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+class DashboardCache:
+    """Loads the shared dashboard and, if elected, keeps it rebuilt."""
+
+    def __init__(self, app, path, dirty_path, interval=60, debounce=1.0, poll=0.5):
+        self.app = app
+        self.path = path
+        self.dirty_path = dirty_path
+        self.interval = interval
+        self.debounce = debounce
+        self.poll = poll
+        self._snapshot = None
+        self._loaded = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dashboard-refresh', daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Build the dashboard and publish it to every process."""
+        # Keep shows a full refresh interval past the window so the page can
+        # trim to exactly 24 hours at render time between refreshes.
+        horizon = UPCOMING_WINDOW + timedelta(seconds=self.interval)
+        if has_app_context():
+            snapshot = build_dashboard(horizon)
+        else:
+            with self.app.app_context():
+                snapshot = build_dashboard(horizon)
+        publish(self.path, snapshot)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _load(self):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return self._snapshot
+        with f:
+            stat = os.fstat(f.fileno())
+            key = (stat.st_ino, stat.st_mtime_ns)
+            if key != self._loaded:
+                with self._lock:
+                    if key != self._loaded:
+                        self._snapshot = pickle.load(f)
+                        self._loaded = key
+        return self._snapshot
+
+    def current(self):
+        """The latest dashboard, with shows trimmed to the next 24 hours."""
+        snapshot = self._load()
+        if snapshot is None:
+            # Nothing published yet, e.g. on the very first request.
+            with self._lock:
+                snapshot = self._snapshot or self.refresh()
+        now = datetime.now()
+        shows = [show for show in snapshot.shows if now < show.start_time <= now + UPCOMING_WINDOW]
+        return snapshot._replace(shows=shows)
+
+    def _dirty_since(self, built):
+        try:
+            return os.stat(self.dirty_path).st_mtime_ns > built
+        except FileNotFoundError:
+            return False
+
+    def _run(self):
+        with open(self.path + '.lock', 'a') as lock:
+            # Only the process holding the lock rebuilds; the others wait here
+            # and take over if it exits.
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            built = 0
+            next_build = 0
+            while True:
+                dirty = self._dirty_since(built)
+                if dirty or time.monotonic() >= next_build:
+                    if dirty and built:
+                        # Coalesce bursts of writes into a single rebuild.
+                        time.sleep(self.debounce)
+                    built = time.time_ns()
+                    next_build = time.monotonic() + self.interval
+                    try:
+                        self.refresh()
+                    except Exception:
+                        self.app.logger.exception('dashboard refresh failed')
+                time.sleep(self.poll)
@@ -0,0 +1,177 @@
+"""Write operations shared by the request handlers and the write-behind workers.
+
+Every function here stages its changes on ``db.session`` and leaves the
+commit to the caller, so a worker can apply a whole batch of queued jobs
+in one transaction. Arguments are plain JSON-serializable values so the
+same calls can be recorded in the job queue.
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+
+from locations import locate
+from models import db, Venue, Artist, Show
+
+
+# ----------------------------------------------------------------------------#
+# Form values.
+# ----------------------------------------------------------------------------#
+
+def venue_values(form):
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'genres': form.genres.data,
+        'website': form.website_link.data,
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': form.seeking_description.data,
+    }
+
+
+def artist_values(form):
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'genres': form.genres.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'website': form.website_link.data,
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': form.seeking_description.data,
+    }
+
+
+def form_data(view):
+    """Edit form data for a ``readmodels.VenueView`` or ``ArtistView``."""
+    return dict(view._asdict(), website_link=view.website)
+
+
+def show_values(form):
+    return {
+        'start_time': form.start_time.data.isoformat(),
+        'venue_id': form.venue_id.data,
+        'artist_id': form.artist_id.data,
+    }
+
+
+# ----------------------------------------------------------------------------#
+# Writes.
+# ----------------------------------------------------------------------------#
+
+def create_venue(values):
+    db.session.add(Venue(**values, location_id=locate(values['city'], values['state'])))
+
+
+def create_artist(values):
+    db.session.add(Artist(**values))
+
+
+def create_show(values):
+    values = dict(values, start_time=datetime.fromisoformat(values['start_time']))
+    db.session.add(Show(**values))
+
+
+class Conflict(Exception):
+    """The row was changed or deleted after the version an edit started from."""
+
+    def __init__(self, model, row_id, version):
+        super().__init__(f'{model.__name__} {row_id} was changed or deleted after version '
+                         f'{version}; the edit was not applied')
+        self.row_id = row_id
+        self.version = version
+
+
+def _changes(model, row_id, version, values):
+    # Reads only the edited columns, never the ORM object and its shows.
+    columns = [getattr(model, field) for field in values]
+    row = db.session.execute(
+        select(model.version, *columns).where(model.id == row_id)).first()
+    if row is None or row.version != version:
+        raise Conflict(model, row_id, version)
+    return {field: value for field, value in values.items() if getattr(row, field) != value}
+
+
+def _apply(model, row_id, version, changes):
+    if not changes:
+        return False
+    result = db.session.execute(
+        update(model)
+        .where(model.id == row_id, model.version == version)
+        .values({**changes, 'version': model.version + 1})
+        .execution_options(synchronize_session=False))
+    if result.rowcount != 1:
+        # Changed by another transaction since _changes() read it.
+        raise Conflict(model, row_id, version)
+    return True
+
+
+def update_venue(venue_id, version, values):
+    """Write the fields of ``values`` that differ from the stored row.
+
+    Raises ``Conflict`` unless the row is still at ``version``; returns
+    whether anything changed.
+    """
+    changes = _changes(Venue, venue_id, version, values)
+    if changes.keys() & {'city', 'state'}:
+        changes['location_id'] = locate(values['city'], values['state'])
+    return _apply(Venue, venue_id, version, changes)
+
+
+def update_artist(artist_id, version, values):
+    """Like ``update_venue``."""
+    return _apply(Artist, artist_id, version, _changes(Artist, artist_id, version, values))
+
+
+def _delete_many(model, show_column, ids):
+    # Set-based deletes: nothing is loaded into the session. Shows are removed
+    # explicitly as well as by ON DELETE CASCADE so this also holds on
+    # databases that predate the cascade migration.
+    db.session.execute(delete(Show).where(show_column.in_(ids)))
+    rows = db.session.execute(
+        delete(model).where(model.id.in_(ids)).returning(model.id, model.name))
+    return dict(rows.all())
+
+
+def delete_venues(venue_ids):
+    """Delete venues and their shows; returns the deleted ``{id: name}``."""
+    return _delete_many(Venue, Show.venue_id, venue_ids)
+
+
+def delete_artists(artist_ids):
+    """Delete artists and their shows; returns the deleted ``{id: name}``."""
+    return _delete_many(Artist, Show.artist_id, artist_ids)
+
+
+# Job kinds accepted by the write-behind queue.
+def _queued_update(update, model):
+    # Jobs queued before edits carried a version have only (id, values);
+    # they apply on top of whatever version is current, as they used to.
+    def apply(row_id, *args):
+        if len(args) == 1:
+            version = db.session.execute(select(model.version).where(model.id == row_id)).scalar()
+            if version is None:
+                raise Conflict(model, row_id, None)
+            args = (version,) + args
+        return update(row_id, *args)
+    return apply
+
+
+APPLY = {
+    'create_venue': create_venue,
+    'create_artist': create_artist,
+    'create_show': create_show,
+    'update_venue': _queued_update(update_venue, Venue),
+    'update_artist': _queued_update(update_artist, Artist),
+    'delete_venues': delete_venues,
+    'delete_artists': delete_artists,
+    # Single-item kinds from before bulk deletes, for jobs still queued.
+    'delete_venue': lambda venue_id: delete_venues([venue_id]),
+    'delete_artist': lambda artist_id: delete_artists([artist_id]),
+}